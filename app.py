@@ -1,11 +1,15 @@
 import streamlit as st
-import numpy as np
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing import image
-import json
-from PIL import Image
-import gdown
 import os
+import tempfile
+
+import cache
+import embedding_index
+import feedback_log
+import inference
+import metrics
+import model_loader
+import tiling
+import video
 
 # Import the disease information dictionary
 from Diseases_info import DISEASE_INFO
@@ -62,147 +66,608 @@ st.markdown("""
 # --- 2. MODEL AND LABELS LOADING ---
 
 @st.cache_resource
-def download_and_load_model():
+def get_model_loader():
     """
-    Downloads the model from Google Drive if it doesn't exist,
-    then loads and returns the Keras model.
+    Starts downloading, verifying and loading the model on a background
+    thread, so the page renders while TensorFlow starts up.
     """
-    MODEL_ID = "1ozwUc7E-CO88WAQaiKXc8eG6G533sVpB"
-    MODEL_PATH = "final_model.keras"
-    
-    if not os.path.exists(MODEL_PATH):
-        with st.spinner("Downloading the AI model... this may take a moment ⏳"):
-            gdown.download(f"https://drive.google.com/uc?id={MODEL_ID}", MODEL_PATH, quiet=False)
-    
-    model = load_model(MODEL_PATH)
-    return model
+    return model_loader.ModelLoader().start()
+
+LOADING_MESSAGES = {
+    model_loader.PENDING: "Starting up the AI model... ⏳",
+    model_loader.CONNECTING: "Connecting to the AI model server... ⏳",
+    model_loader.IMPORTING: "Starting up the AI model... ⏳",
+    model_loader.VERIFYING: "Checking the AI model... ⏳",
+    model_loader.DOWNLOADING: "Downloading the AI model... this may take a moment ⏳",
+    model_loader.DESERIALIZING: "Loading the AI model... ⏳",
+    model_loader.WARMING_UP: "Warming up the AI model... ⏳",
+}
+
+def get_model():
+    """
+    Returns the loaded inference backend, waiting for the background load to
+    finish if necessary. Stops the script with an error if loading failed;
+    the failed loader is dropped so the next rerun tries again.
+    """
+    if not loader.ready:
+        with st.spinner(LOADING_MESSAGES.get(loader.state, "Loading the AI model... ⏳")):
+            try:
+                loader.wait()
+            except Exception as e:
+                get_model_loader.clear()
+                st.error(f"The AI model could not be loaded: {e}")
+                st.stop()
+    return loader.backend
 
 @st.cache_data
 def load_labels():
     """
     Loads and returns the class labels from the JSON file.
     """
-    with open("class_indices.json", "r") as f:
-        class_indices = json.load(f)
-    labels = {v: k for k, v in class_indices.items()}
-    return labels
+    return inference.load_labels()
+
+@st.cache_resource
+def get_prediction_log():
+    """
+    Creates the background prediction/feedback logger shared by every session.
+    """
+    return feedback_log.create_log()
+
+@st.cache_resource
+def get_embedding_index():
+    """
+    Opens the similar-case index shared by every session.
+    """
+    return embedding_index.create_index()
+
+@st.cache_resource
+def get_model_fingerprint():
+    """
+    Digest of the model files being served (the TFLite artifact or Keras
+    model, plus a cascade's cheap model), recomputed only when they change.
+    """
+    return cache.FileFingerprint(inference.served_model_paths())
+
+@st.cache_resource
+def get_embedding_fingerprint():
+    """
+    Digest of the Keras model, which produces the similar-case embeddings.
+    """
+    return embedding_index.model_fingerprint(inference.MODEL_PATH)
 
-# Load the resources
-model = download_and_load_model()
+@st.cache_resource
+def get_prediction_cache():
+    """
+    Creates the prediction cache shared by every session in this process.
+    """
+    return cache.create_cache(inference.served_model_paths(), inference.LABELS_PATH)
+
+METRICS_FILE = os.environ.get("PLANT_METRICS_FILE")
+
+# Uploads are decoded at just enough resolution to display them; the model
+# itself only needs 128x128.
+DISPLAY_SIZE = (512, 512)
+
+# Number of similar confirmed cases shown under a diagnosis
+SIMILAR_CASES = 4
+
+# Load the resources; the model itself finishes loading in the background
+loader = get_model_loader()
 labels = load_labels()
+prediction_cache = get_prediction_cache()
+prediction_log = get_prediction_log()
+case_index = get_embedding_index()
+model_fingerprint = get_model_fingerprint()
+embedding_fingerprint = get_embedding_fingerprint()
 
 # --- 3. PREDICTION LOGIC ---
-def predict(img):
+def _to_result(probabilities, route=None):
+    label, confidence = inference.decode_predictions(labels, probabilities[None])[0]
+    result = {"label": label, "confidence": confidence, "probabilities": [float(p) for p in probabilities]}
+    if route is not None:
+        # Which model of the cascade answered, and under which thresholds
+        result["route"] = route
+    return result
+
+def log_results(results, data, source):
+    """
+    Records each result in the prediction log (without waiting for the write)
+    and attaches the returned prediction id for feedback.
+    """
+    if prediction_log is None:
+        return results
+    digest = model_fingerprint.digest
+    logged = []
+    for result, blob in zip(results, data):
+        result = dict(result)
+        result["prediction_id"] = prediction_log.log_prediction(
+            blob, result["label"], result["confidence"], result["probabilities"], digest, source,
+            route=result.get("route")
+        )
+        logged.append(result)
+    return logged
+
+def predict(img, data, with_embedding=False):
+    """
+    Takes a PIL image and its raw upload bytes and returns a result dict with
+    the label, confidence and full probability vector, plus the model's
+    embedding of the image (None if the backend can't provide one) if
+    `with_embedding` is set. Results are served from (or stored in) the
+    prediction cache and recorded in the prediction log.
+    """
+    result = prediction_cache.get(data) if prediction_cache is not None else None
+    if result is not None and (not with_embedding or "embedding" in result):
+        return log_results([result], [data], "single")[0]
+    # Only misses wait for the model, so cache hits are instant even while it loads.
+    model = get_model()
+    if with_embedding:
+        # The embedding needs a full-model pass, so that pass also gives the
+        # diagnosis instead of running a cascade's cheap model as well.
+        probabilities, embedding, route = inference.predict_with_embedding_routed(model, img)
+        result = _to_result(probabilities, route)
+        result["embedding"] = None if embedding is None else [float(x) for x in embedding]
+    else:
+        probabilities, routes = inference.predict_batch_routed(model, [img])
+        result = _to_result(probabilities[0], routes[0])
+    if prediction_cache is not None:
+        prediction_cache.put(data, result)
+    return log_results([result], [data], "single")[0]
+
+def needs_embedding():
+    """
+    True if the similar-case index has cases this model's embeddings can be
+    searched against; otherwise the embedding is only computed when a case is
+    confirmed (see index_confirmed_case).
+    """
+    return case_index is not None and len(case_index) > 0 and case_index.compatible_with(embedding_fingerprint.digest)
+
+def predict_batch(images, data, batch_size=16):
+    """
+    Runs a list of PIL images through the model in batches of `batch_size`.
+    Returns a list of result dicts in input order; only cache misses are sent
+    to the model, and only they wait for it to finish loading.
+    """
+    results = [None] * len(images)
+    misses = []
+    for i, blob in enumerate(data):
+        cached = prediction_cache.get(blob) if prediction_cache is not None else None
+        if cached is None:
+            misses.append(i)
+        else:
+            results[i] = cached
+    if misses:
+        fresh, routes = inference.predict_batch_routed(get_model(), [images[i] for i in misses], batch_size=batch_size)
+        for i, probabilities, route in zip(misses, fresh, routes):
+            results[i] = _to_result(probabilities, route)
+            if prediction_cache is not None:
+                prediction_cache.put(data[i], results[i])
+    return log_results(results, data, "batch")
+
+def predict_field_photo(img, tile_size, overlap):
     """
-    Takes a PIL image and returns the prediction label and confidence.
+    Runs tiled inference over a wide field photo.
     """
-    img = img.resize((128, 128))
-    img_array = image.img_to_array(img) / 255.0
-    img_array = np.expand_dims(img_array, axis=0)
-    prediction = model.predict(img_array)[0]
-    class_index = np.argmax(prediction)
-    confidence = float(np.max(prediction))
-    return labels[class_index], confidence
+    return tiling.predict_tiled(get_model(), labels, img, tile_size=tile_size, overlap=overlap)
+
+def render_detection_summary(class_amounts, class_frames, amount_label="Seconds"):
+    """
+    Renders a table of how long (and in how many scored frames) each class was detected.
+    """
+    st.dataframe(
+        [
+            {
+                "Diagnosis": inference.format_label(label),
+                amount_label: round(amount, 1),
+                "Scored frames": class_frames.get(label, 0),
+            }
+            for label, amount in sorted(class_amounts.items(), key=lambda item: -item[1])
+        ],
+        hide_index=True,
+        use_container_width=True
+    )
+
+def export_metrics():
+    """
+    Writes the metrics in Prometheus text format to PLANT_METRICS_FILE, if set.
+    """
+    if METRICS_FILE:
+        metrics.write_textfile(METRICS_FILE)
 
 # --- 4. USER INTERFACE ---
+def render_diagnosis(label, confidence):
+    """
+    Renders the result card and the advisory section for a single diagnosis.
+    """
+    # Clean the raw label for a human-readable display
+    display_label = inference.format_label(label)
+
+    # Display the result in our custom-styled card
+    st.markdown('<div class="result-card">', unsafe_allow_html=True)
+    st.markdown(f'<div class="diagnosis-header">{display_label}</div>', unsafe_allow_html=True)
+    st.progress(confidence)
+    st.markdown(f'<div class="confidence-text">Confidence: <strong>{confidence*100:.2f}%</strong></div>', unsafe_allow_html=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+    # --- 5. REVISED ADVISORY AND WARNINGS SECTION ---
+    st.markdown("---")
+    
+    # Display a prominent, general disclaimer for ALL diagnoses
+    st.warning(
+        "**Disclaimer:** This AI diagnosis is for informational purposes only and is not a substitute for professional advice. "
+        "Visual symptoms can be misleading. For a definitive diagnosis and treatment plan, consult a local agricultural extension service or certified agronomist."
+    )
+
+    info = DISEASE_INFO.get(label)
+
+    # CRITICAL BUG FIX: Check if the plant is healthy before trying to show disease info
+    if label.endswith("___healthy"):
+        st.balloons()
+        st.success(f"**Great news! The model indicates your {display_label.replace(' Healthy', '')} plant is healthy.**")
+        if info and info.get('maintenance_tips'):
+            st.subheader("Tips for Maintaining Health")
+            for tip in info['maintenance_tips']:
+                st.markdown(f"- {tip}")
+    elif info:
+        # This block now only runs for non-healthy diagnoses
+        st.subheader(f"Advisory for {display_label}")
+        tab1, tab2, tab3 = st.tabs(["📋 Description & Symptoms", "💊 Treatment Options", "🛡️ Prevention Strategy"])
+
+        with tab1:
+            st.write(info.get('description', 'No description available.'))
+            st.subheader("Common Symptoms")
+            symptoms = info.get('symptoms', [])
+            if symptoms:
+                for symptom in symptoms:
+                    st.markdown(f"- {symptom}")
+            else:
+                st.write("No symptoms listed.")
+
+        with tab2:
+            st.subheader("Organic Solutions")
+            st.info(info.get('treatment', {}).get('organic', 'No organic treatments listed.'))
+            
+            st.subheader("Chemical Solutions")
+            # SPECIFIC AND DETAILED CHEMICAL USE WARNING
+            st.error(
+                "**⚠️ CRITICAL SAFETY WARNING ⚠️**\n\n"
+                "Chemical treatments should be a **last resort** within an Integrated Pest Management (IPM) strategy. "
+                "If you must use chemicals:\n\n"
+                "1.  **Verify the Diagnosis:** Get professional confirmation before you spray.\n"
+                "2.  **Follow Local Laws:** Chemical use is highly regulated. Check regulations for Madhya Pradesh.\n"
+                "3.  **Read the Label:** The label is the law. Follow all instructions for mixing, application, and Personal Protective Equipment (PPE).\n"
+                "4.  **Protect Pollinators:** Do not spray when bees and other beneficial insects are active."
+            )
+            st.warning(info.get('treatment', {}).get('chemical', 'No chemical treatments listed.'))
+            
+        with tab3:
+            st.subheader("How to Prevent This")
+            st.info(info.get('prevention', 'No prevention information available.'))
+    else:
+        st.error("Could not retrieve advisory information for this diagnosis.")
+
+def render_similar_cases(result, image_sha):
+    """
+    Shows the confirmed cases whose embeddings are closest to this image's,
+    and flags it when they disagree with the diagnosis.
+    """
+    if case_index is None or not result.get("embedding"):
+        return
+    if not case_index.compatible_with(embedding_fingerprint.digest):
+        # Built from a different model's embeddings; see `embedding_index.py build --rebuild`
+        return
+    with metrics.timed("similar_cases"):
+        neighbors = case_index.search(result["embedding"], k=SIMILAR_CASES, exclude_shas={image_sha})
+    if not neighbors:
+        return
+    st.subheader("Similar Confirmed Cases")
+    cols = st.columns(SIMILAR_CASES)
+    for col, neighbor in zip(cols, neighbors):
+        with col:
+            if neighbor["image_path"] and os.path.exists(neighbor["image_path"]):
+                st.image(neighbor["image_path"], use_column_width=True)
+            st.caption(f"{inference.format_label(neighbor['label'])} ({neighbor['score']*100:.0f}% similar)")
+    if any(n["label"] != result["label"] for n in neighbors):
+        st.info("Some similar confirmed cases had a different diagnosis. Compare the symptoms before acting on this result.")
+
+def render_batch_results(names, images, results, columns=3):
+    """
+    Renders a grid of thumbnails with the predicted label and confidence for each image.
+    """
+    for start in range(0, len(results), columns):
+        cols = st.columns(columns)
+        for col, name, img, result in zip(
+            cols, names[start:start + columns], images[start:start + columns], results[start:start + columns]
+        ):
+            with col:
+                st.image(img, caption=name, use_column_width=True)
+                st.markdown(f"**{inference.format_label(result['label'])}**")
+                st.progress(result["confidence"])
+                st.caption(f"Confidence: {result['confidence']*100:.2f}%")
+
+if loader.state == model_loader.FAILED:
+    st.sidebar.error(f"Model failed to load: {loader.error}")
+    # Don't keep a failed loader for the life of the process (e.g. after a
+    # transient download error); the next rerun starts a fresh one.
+    get_model_loader.clear()
+    if st.sidebar.button("Retry loading the model"):
+        st.rerun()
+elif not loader.ready:
+    st.sidebar.info(LOADING_MESSAGES.get(loader.state, "Loading the AI model... ⏳"))
+elif os.environ.get("PLANT_STARTUP_REPORT"):
+    with st.sidebar.expander("Startup report"):
+        st.code(loader.report())
+
+if prediction_cache is not None:
+    cache_stats = prediction_cache.stats()
+    st.sidebar.caption(
+        f"Prediction cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+        f"({cache_stats['hit_rate']*100:.0f}% hit rate)"
+    )
+
 st.title("Plant Disease Diagnosis")
 st.markdown("<p>Your digital assistant for a healthier harvest.</p>", unsafe_allow_html=True)
 
-uploaded_file = st.file_uploader(
-    "Upload a clear image of a plant leaf",
-    type=["jpg", "jpeg", "png"]
+mode = st.radio(
+    "Diagnosis mode",
+    ["Single image", "Multiple images", "Field photo", "Video / camera"],
+    horizontal=True
 )
 
-if uploaded_file is None:
-    st.info("Please upload an image to get started.")
-else:
-    # Display the image in a controlled column
-    col1, col2, col3 = st.columns([1, 2, 1])
-    with col2:
-        img = Image.open(uploaded_file).convert("RGB")
-        st.image(img, caption='Your Uploaded Leaf', use_column_width=True)
-
-    # A clear call-to-action button to trigger the diagnosis
-    if st.button('Diagnose My Plant', use_container_width=True, type="primary"):
-        with st.spinner('The AI is analyzing the leaf...'):
-            label, confidence = predict(img)
-
-        # Clean the raw label for a human-readable display
-        display_label = label.replace('___', ' ').replace('_', ' ').title()
-
-        # Display the result in our custom-styled card
-        st.markdown('<div class="result-card">', unsafe_allow_html=True)
-        st.markdown(f'<div class="diagnosis-header">{display_label}</div>', unsafe_allow_html=True)
-        st.progress(confidence)
-        st.markdown(f'<div class="confidence-text">Confidence: <strong>{confidence*100:.2f}%</strong></div>', unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
-
-        # --- 5. REVISED ADVISORY AND WARNINGS SECTION ---
-        st.markdown("---")
-        
-        # Display a prominent, general disclaimer for ALL diagnoses
-        st.warning(
-            "**Disclaimer:** This AI diagnosis is for informational purposes only and is not a substitute for professional advice. "
-            "Visual symptoms can be misleading. For a definitive diagnosis and treatment plan, consult a local agricultural extension service or certified agronomist."
-        )
+if mode == "Multiple images":
+    batch_size = st.sidebar.select_slider(
+        "Inference batch size",
+        options=[1, 2, 4, 8, 16, 32, 64],
+        value=16
+    )
+    uploaded_files = st.file_uploader(
+        "Upload clear images of plant leaves",
+        type=["jpg", "jpeg", "png"],
+        accept_multiple_files=True
+    )
 
-        info = DISEASE_INFO.get(label)
-
-        # CRITICAL BUG FIX: Check if the plant is healthy before trying to show disease info
-        if label.endswith("___healthy"):
-            st.balloons()
-            st.success(f"**Great news! The model indicates your {display_label.replace(' Healthy', '')} plant is healthy.**")
-            if info and info.get('maintenance_tips'):
-                st.subheader("Tips for Maintaining Health")
-                for tip in info['maintenance_tips']:
-                    st.markdown(f"- {tip}")
-        elif info:
-            # This block now only runs for non-healthy diagnoses
-            st.subheader(f"Advisory for {display_label}")
-            tab1, tab2, tab3 = st.tabs(["📋 Description & Symptoms", "💊 Treatment Options", "🛡️ Prevention Strategy"])
-
-            with tab1:
-                st.write(info.get('description', 'No description available.'))
-                st.subheader("Common Symptoms")
-                symptoms = info.get('symptoms', [])
-                if symptoms:
-                    for symptom in symptoms:
-                        st.markdown(f"- {symptom}")
-                else:
-                    st.write("No symptoms listed.")
-
-            with tab2:
-                st.subheader("Organic Solutions")
-                st.info(info.get('treatment', {}).get('organic', 'No organic treatments listed.'))
-                
-                st.subheader("Chemical Solutions")
-                # SPECIFIC AND DETAILED CHEMICAL USE WARNING
-                st.error(
-                    "**⚠️ CRITICAL SAFETY WARNING ⚠️**\n\n"
-                    "Chemical treatments should be a **last resort** within an Integrated Pest Management (IPM) strategy. "
-                    "If you must use chemicals:\n\n"
-                    "1.  **Verify the Diagnosis:** Get professional confirmation before you spray.\n"
-                    "2.  **Follow Local Laws:** Chemical use is highly regulated. Check regulations for Madhya Pradesh.\n"
-                    "3.  **Read the Label:** The label is the law. Follow all instructions for mixing, application, and Personal Protective Equipment (PPE).\n"
-                    "4.  **Protect Pollinators:** Do not spray when bees and other beneficial insects are active."
+    if not uploaded_files:
+        st.info("Please upload one or more images to get started.")
+    else:
+        st.write(f"{len(uploaded_files)} image(s) ready for diagnosis.")
+        if st.button('Diagnose All Plants', use_container_width=True, type="primary"):
+            names = [f.name for f in uploaded_files]
+            with st.spinner(f'The AI is analyzing {len(uploaded_files)} leaves...'):
+                batch_images = [inference.load_image(f, min_size=DISPLAY_SIZE) for f in uploaded_files]
+                results = predict_batch(
+                    batch_images,
+                    [f.getvalue() for f in uploaded_files],
+                    batch_size=batch_size
+                )
+            st.session_state["last_prediction_ids"] = [r.get("prediction_id") for r in results]
+            with metrics.timed("render"):
+                render_batch_results(names, batch_images, results)
+            export_metrics()
+elif mode == "Video / camera":
+    sample_fps = st.sidebar.slider("Frames sampled per second", min_value=0.5, max_value=10.0, value=video.DEFAULT_SAMPLE_FPS, step=0.5)
+    change_threshold = st.sidebar.slider(
+        "Change threshold",
+        min_value=0.0, max_value=0.3, value=video.DEFAULT_CHANGE_THRESHOLD, step=0.01,
+        help="Frames closer than this to the last scored frame are skipped."
+    )
+    source = st.radio("Source", ["Upload a video", "Use the camera"], horizontal=True)
+
+    if source == "Upload a video":
+        uploaded_video = st.file_uploader(
+            "Upload a short video walking along the row",
+            type=["mp4", "mov", "avi", "webm"]
+        )
+        if uploaded_video is None:
+            st.info("Please upload a video to get started.")
+        elif st.button('Scan Video', use_container_width=True, type="primary"):
+            suffix = os.path.splitext(uploaded_video.name)[1]
+            with st.spinner('The AI is scanning the video...'):
+                with tempfile.NamedTemporaryFile(suffix=suffix) as tmp:
+                    tmp.write(uploaded_video.getvalue())
+                    tmp.flush()
+                    try:
+                        result = video.scan_video(
+                            get_model(), labels, tmp.name,
+                            sample_fps=sample_fps, change_threshold=change_threshold
+                        )
+                    except (ImportError, ValueError) as e:
+                        st.error(str(e))
+                        st.stop()
+            if result["label"] is None:
+                st.warning("No frames could be read from this video.")
+            else:
+                st.caption(
+                    f"Scored {result['frames_scored']} of {result['frames_sampled']} sampled frames; "
+                    "the rest were near-identical to the previous scored frame."
                 )
-                st.warning(info.get('treatment', {}).get('chemical', 'No chemical treatments listed.'))
-                
-            with tab3:
-                st.subheader("How to Prevent This")
-                st.info(info.get('prevention', 'No prevention information available.'))
+                with metrics.timed("render"):
+                    render_detection_summary(result["class_seconds"], result["class_frames"])
+                    render_diagnosis(result["label"], result["confidence"])
+                export_metrics()
+    else:
+        # Snapshots accumulate into one scouting session until it is reset.
+        if "camera_session" not in st.session_state or st.button("Start a new scouting session"):
+            st.session_state["camera_session"] = {
+                "detector": video.ChangeDetector(change_threshold),
+                "class_snapshots": {},
+                "class_frames": {},
+                "last_label": None,
+                "snapshots": 0,
+            }
+        session = st.session_state["camera_session"]
+        session["detector"].threshold = change_threshold
+        snapshot = st.camera_input("Point the camera at the leaves and take a snapshot")
+        if snapshot is not None and st.session_state.get("last_snapshot_id") != snapshot.file_id:
+            st.session_state["last_snapshot_id"] = snapshot.file_id
+            session["snapshots"] += 1
+            img = inference.load_image(snapshot, min_size=DISPLAY_SIZE)
+            if session["detector"].is_new(img):
+                with st.spinner('The AI is analyzing the leaf...'):
+                    result = predict(img, snapshot.getvalue())
+                label = result["label"]
+                session["class_frames"][label] = session["class_frames"].get(label, 0) + 1
+                session["last_label"] = label
+                st.session_state["last_prediction_ids"] = [result.get("prediction_id")]
+                st.success(f"{inference.format_label(label)} ({result['confidence']*100:.1f}%)")
+            else:
+                label = session["last_label"]
+                st.caption("Scene unchanged since the last scored snapshot; skipped.")
+            if label is not None:
+                # Each snapshot counts as one observation of the current scene.
+                session["class_snapshots"][label] = session["class_snapshots"].get(label, 0) + 1
+        if session["class_frames"]:
+            st.caption(f"{session['snapshots']} snapshots this session.")
+            render_detection_summary(session["class_snapshots"], session["class_frames"], "Snapshots")
+elif mode == "Field photo":
+    tile_size = st.sidebar.slider("Tile size (pixels)", min_value=128, max_value=768, value=tiling.DEFAULT_TILE_SIZE, step=64)
+    overlap = st.sidebar.slider("Tile overlap", min_value=0.0, max_value=0.75, value=tiling.DEFAULT_OVERLAP, step=0.05)
+    uploaded_file = st.file_uploader(
+        "Upload a wide photo of a crop row or several leaves",
+        type=["jpg", "jpeg", "png"]
+    )
+
+    if uploaded_file is None:
+        st.info("Please upload a field photo to get started.")
+    elif st.button('Scan Field Photo', use_container_width=True, type="primary"):
+        with st.spinner('The AI is scanning the photo region by region...'):
+            try:
+                field_img = tiling.open_bounded(uploaded_file)
+            except ValueError as e:
+                st.error(str(e))
+                st.stop()
+            result = predict_field_photo(field_img, tile_size, overlap)
+        if result["label"] is not None:
+            logged = log_results([{
+                "label": result["label"],
+                "confidence": result["confidence"],
+                "probabilities": [result["class_scores"][labels[i]] for i in sorted(labels)],
+            }], [uploaded_file.getvalue()], "field")
+            st.session_state["last_prediction_ids"] = [logged[0].get("prediction_id")]
+        if result["label"] is None:
+            st.warning("No leaves were found in this photo. Try a closer shot with more foliage in view.")
         else:
-            st.error("Could not retrieve advisory information for this diagnosis.")
+            with metrics.timed("render"):
+                st.image(
+                    tiling.render_heatmap(field_img, result),
+                    caption="Disease heatmap (red = likely diseased, green = likely healthy)",
+                    use_column_width=True
+                )
+                st.caption(
+                    f"{len(result['boxes'])} leaf regions scanned: "
+                    + ", ".join(f"{inference.format_label(l)} ({n})" for l, n in sorted(
+                        result["tile_counts"].items(), key=lambda item: -item[1]
+                    ))
+                )
+                render_diagnosis(result["label"], result["confidence"])
+            export_metrics()
+else:
+    uploaded_file = st.file_uploader(
+        "Upload a clear image of a plant leaf",
+        type=["jpg", "jpeg", "png"]
+    )
+
+    if uploaded_file is None:
+        st.info("Please upload an image to get started.")
+    else:
+        # Display the image in a controlled column
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col2:
+            img = inference.load_image(uploaded_file, min_size=DISPLAY_SIZE)
+            st.image(img, caption='Your Uploaded Leaf', use_column_width=True)
+
+        # A clear call-to-action button to trigger the diagnosis
+        data = uploaded_file.getvalue()
+        upload_sha = cache.hash_bytes(data)
+        if st.button('Diagnose My Plant', use_container_width=True, type="primary"):
+            with st.spinner('The AI is analyzing the leaf...'):
+                result = predict(img, data, with_embedding=needs_embedding())
+            # Keep the diagnosis across reruns (e.g. the feedback buttons below)
+            st.session_state["last_diagnosis"] = (upload_sha, result)
+            st.session_state["last_prediction_ids"] = [result.get("prediction_id")]
+            st.session_state["last_case"] = {
+                "prediction_id": result.get("prediction_id"),
+                "label": result["label"],
+                "embedding": result.get("embedding"),
+                "image_sha256": upload_sha,
+                "image_path": prediction_log.image_path(upload_sha, data) if prediction_log is not None else None,
+            }
+            with metrics.timed("render"):
+                render_diagnosis(result["label"], result["confidence"])
+                render_similar_cases(result, upload_sha)
+            export_metrics()
+        elif st.session_state.get("last_diagnosis", (None,))[0] == upload_sha:
+            result = st.session_state["last_diagnosis"][1]
+            render_diagnosis(result["label"], result["confidence"])
+            render_similar_cases(result, upload_sha)
+
+if st.sidebar.checkbox("Show timing debug panel"):
+    summary = metrics.stage_summary()
+    if summary:
+        st.sidebar.dataframe(
+            [{"stage": stage, **{k: round(v, 2) for k, v in stats.items()}} for stage, stats in summary.items()],
+            hide_index=True
+        )
+    else:
+        st.sidebar.caption("No timings recorded yet.")
 
 # --- 6. FOOTER AND FEEDBACK ---
 st.markdown("---")
 st.subheader("Was this diagnosis helpful?")
+def record_feedback(helpful, correct_label=None):
+    """
+    Attaches the user's feedback to the predictions from the last diagnosis.
+    """
+    if prediction_log is None:
+        return
+    for prediction_id in st.session_state.get("last_prediction_ids", []):
+        if prediction_id:
+            prediction_log.record_feedback(prediction_id, helpful, correct_label)
+    index_confirmed_case(helpful, correct_label)
+
+def index_confirmed_case(helpful, correct_label=None):
+    """
+    Adds the last single-image diagnosis to the similar-case index once the
+    user confirms it (or corrects its label).
+    """
+    case = st.session_state.get("last_case")
+    if case_index is None or not case or not case["prediction_id"]:
+        return
+    if case["prediction_id"] not in st.session_state.get("last_prediction_ids", []):
+        return
+    label = case["label"] if helpful else correct_label
+    if label is None:
+        return
+    embedding = case["embedding"]
+    if embedding is None:
+        # The diagnosis skipped the embedding while the index was empty; compute it from the logged image.
+        if not case["image_path"] or not os.path.exists(case["image_path"]):
+            return
+        embedding = inference.embed(get_model(), inference.load_image(case["image_path"]))
+        if embedding is None:
+            return
+    try:
+        case_index.add(
+            [embedding], [label], [case["prediction_id"]],
+            image_paths=[case["image_path"]], image_shas=[case["image_sha256"]],
+            model_digest=embedding_fingerprint.digest
+        )
+    except ValueError as e:
+        print(f"Could not add case to the similar-case index: {e}")
+        return
+    case_index.maybe_train_async()
+
+correct_label = st.selectbox(
+    "If the diagnosis was wrong, what is the correct one? (optional)",
+    [None] + [labels[i] for i in sorted(labels)],
+    format_func=lambda l: "—" if l is None else inference.format_label(l)
+)
 feedback_cols = st.columns(2)
 with feedback_cols[0]:
     if st.button("👍 Yes, it was helpful", use_container_width=True):
+        record_feedback(True)
         st.success("Thank you for your feedback!")
 with feedback_cols[1]:
     if st.button("👎 No, this was incorrect", use_container_width=True):
+        record_feedback(False, correct_label)
         st.warning("We appreciate your feedback. This helps us improve our AI.")
 
 st.markdown('<div class="footer">Developed by Mr. Aashish Tiwari</div>', unsafe_allow_html=True)
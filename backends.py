@@ -0,0 +1,309 @@
+"""
+Inference backends used behind `inference.predict()`.
+
+Every backend exposes `predict(batch)`, taking a float32 array of shape
+(N, 128, 128, 3) scaled to [0, 1] and returning an (N, num_classes) array of
+probabilities. Backends that can also return the model's penultimate-layer
+embedding (used for similar-case retrieval) implement
+`predict_with_embeddings`. The backend is chosen by `create_backend()` from
+a config dict or from the environment:
+
+    PLANT_BACKEND            "keras" (default), "tflite", or "auto" to pick the
+                             fastest artifact from an optimization manifest
+    PLANT_TFLITE_MODEL       path to the .tflite file for the tflite backend
+    PLANT_MODEL_MANIFEST     manifest written by optimize_model.py (for "auto")
+    PLANT_ACCURACY_TOLERANCE largest accuracy drop "auto" accepts (default 0.01)
+    PLANT_INTRA_OP_THREADS   threads used inside a single op
+    PLANT_INTER_OP_THREADS   threads used to run independent ops
+    PLANT_CASCADE_MODEL      cheap model to put in front of the backend (see cascade.py)
+
+Run this module directly to compare p50 single-image latency against the
+plain `model.predict` path:
+
+    python backends.py --runs 200
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+# TensorFlow is imported inside the functions that need it so that importing
+# this module (and inference.py) stays cheap until a model is actually loaded.
+
+INPUT_SHAPE = (128, 128, 3)
+DEFAULT_MODEL_PATH = "final_model.keras"
+DEFAULT_TFLITE_PATH = "final_model.tflite"
+DEFAULT_MANIFEST_PATH = os.path.join("models", "manifest.json")
+DEFAULT_ACCURACY_TOLERANCE = 0.01
+DEFAULT_CASCADE_CONFIDENCE = 0.9
+DEFAULT_CASCADE_MARGIN = 0.0
+
+# --- 1. BACKENDS ---
+class InferenceBackend:
+    """
+    Base class for inference backends.
+    """
+    name = "base"
+
+    def predict(self, batch):
+        raise NotImplementedError
+
+    def predict_with_embeddings(self, batch):
+        """
+        Returns (probabilities, (N, dim) penultimate-layer embeddings).
+        """
+        raise NotImplementedError(f"The {self.name} backend does not expose embeddings.")
+
+    def warmup(self, batch_size=1):
+        """
+        Runs a dummy batch so tracing and allocation costs are paid at load time,
+        not by the first user request.
+        """
+        self.predict(np.zeros((batch_size,) + INPUT_SHAPE, dtype=np.float32))
+
+class KerasBackend(InferenceBackend):
+    """
+    Calls the Keras model through a `tf.function` with a fixed input signature.
+    This skips the data adapter and callback setup `model.predict` does on every
+    call, and the fixed signature means the graph is traced exactly once.
+    """
+    name = "keras"
+
+    def __init__(self, model):
+        import tensorflow as tf
+
+        self.model = model
+        self._tf = tf
+        signature = [tf.TensorSpec((None,) + INPUT_SHAPE, tf.float32)]
+        self._forward = tf.function(lambda x: model(x, training=False), input_signature=signature)
+        self._forward_with_embeddings = None
+        try:
+            # Same weights, second output tapped from the layer before the classifier.
+            both = tf.keras.Model(model.inputs, [model.outputs[0], model.layers[-2].output])
+            self._forward_with_embeddings = tf.function(lambda x: both(x, training=False), input_signature=signature)
+        except (AttributeError, IndexError, ValueError, TypeError):
+            pass  # Not a functional/sequential graph; embeddings stay unavailable.
+
+    def predict(self, batch):
+        tf = self._tf
+        return self._forward(tf.convert_to_tensor(batch, dtype=tf.float32)).numpy()
+
+    def predict_with_embeddings(self, batch):
+        if self._forward_with_embeddings is None:
+            return super().predict_with_embeddings(batch)
+        tf = self._tf
+        probabilities, embeddings = self._forward_with_embeddings(tf.convert_to_tensor(batch, dtype=tf.float32))
+        return probabilities.numpy(), embeddings.numpy().reshape(len(batch), -1)
+
+    def warmup(self, batch_size=1):
+        super().warmup(batch_size)
+        if self._forward_with_embeddings is not None:
+            self.predict_with_embeddings(np.zeros((batch_size,) + INPUT_SHAPE, dtype=np.float32))
+
+class TFLiteBackend(InferenceBackend):
+    """
+    Runs a converted .tflite model with the TFLite interpreter.
+    """
+    name = "tflite"
+
+    def __init__(self, model_path, num_threads=None):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"TFLite model not found at {model_path}; "
+                "create one with `python backends.py --export-tflite`."
+            )
+        import tensorflow as tf
+
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        # The interpreter keeps mutable tensor state and is not thread safe.
+        self._lock = threading.Lock()
+
+    def _quantize(self, batch):
+        scale, zero_point = self._input["quantization"]
+        if self._input["dtype"] == np.float32 or not scale:
+            return batch.astype(self._input["dtype"], copy=False)
+        info = np.iinfo(self._input["dtype"])
+        return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(self._input["dtype"])
+
+    def _dequantize(self, output):
+        scale, zero_point = self._output["quantization"]
+        if self._output["dtype"] == np.float32 or not scale:
+            return output.astype(np.float32, copy=False)
+        return (output.astype(np.float32) - zero_point) * scale
+
+    def predict(self, batch):
+        batch = self._quantize(np.asarray(batch, dtype=np.float32))
+        with self._lock:
+            if tuple(self._input["shape"]) != batch.shape:
+                self.interpreter.resize_tensor_input(self._input["index"], batch.shape)
+                self.interpreter.allocate_tensors()
+                self._input = self.interpreter.get_input_details()[0]
+                self._output = self.interpreter.get_output_details()[0]
+            self.interpreter.set_tensor(self._input["index"], batch)
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self._output["index"])
+        return self._dequantize(output)
+
+# --- 2. CONFIGURATION ---
+def _env_int(name):
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+def _env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+def select_artifact(manifest_path=DEFAULT_MANIFEST_PATH, tolerance=DEFAULT_ACCURACY_TOLERANCE,
+                    model_path=DEFAULT_MODEL_PATH):
+    """
+    Returns the fastest artifact in an optimization manifest whose top-1
+    accuracy is within `tolerance` of the original model, or None if there
+    is none, the original model is faster, or the manifest was made from a
+    different version of `model_path`. Artifact paths are resolved relative
+    to the manifest.
+    """
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    if model_path is not None and os.path.exists(model_path):
+        from cache import file_digest
+
+        if manifest.get("source_sha256") != file_digest(model_path):
+            print(f"Ignoring {manifest_path}: it was made from a different {model_path}; "
+                  "re-run optimize_model.py.")
+            return None
+    candidates = [a for a in manifest.get("artifacts", []) if a["accuracy_drop"] <= tolerance]
+    if not candidates:
+        return None
+    best = dict(min(candidates, key=lambda a: a["p50_ms"]))
+    if best["p50_ms"] >= manifest.get("reference", {}).get("p50_ms", float("inf")):
+        return None
+    best["path"] = os.path.join(os.path.dirname(manifest_path), best["path"])
+    return best
+
+def default_config():
+    """
+    Reads the backend configuration from the environment, resolving "auto"
+    to the fastest acceptable artifact (or the Keras model if there is none).
+    """
+    config = {
+        "backend": os.environ.get("PLANT_BACKEND", "keras"),
+        "tflite_path": os.environ.get("PLANT_TFLITE_MODEL", DEFAULT_TFLITE_PATH),
+        "intra_op_threads": _env_int("PLANT_INTRA_OP_THREADS"),
+        "inter_op_threads": _env_int("PLANT_INTER_OP_THREADS"),
+        "cascade_model": os.environ.get("PLANT_CASCADE_MODEL"),
+        "cascade_confidence": _env_float("PLANT_CASCADE_CONFIDENCE", DEFAULT_CASCADE_CONFIDENCE),
+        "cascade_margin": _env_float("PLANT_CASCADE_MARGIN", DEFAULT_CASCADE_MARGIN),
+        "warmup": True,
+    }
+    if config["backend"] == "auto":
+        tolerance = os.environ.get("PLANT_ACCURACY_TOLERANCE")
+        artifact = select_artifact(
+            os.environ.get("PLANT_MODEL_MANIFEST", DEFAULT_MANIFEST_PATH),
+            float(tolerance) if tolerance else DEFAULT_ACCURACY_TOLERANCE
+        )
+        if artifact is None:
+            config["backend"] = "keras"
+        else:
+            config["backend"] = "tflite"
+            config["tflite_path"] = artifact["path"]
+    return config
+
+def configure_threads(intra_op_threads=None, inter_op_threads=None):
+    """
+    Sets TensorFlow's thread pools. This only works before the runtime has
+    executed its first op, so it is a no-op (with a warning) after that.
+    """
+    import tensorflow as tf
+
+    try:
+        if intra_op_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+        if inter_op_threads:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    except RuntimeError as e:
+        print(f"Could not set TensorFlow thread counts: {e}")
+
+def create_backend(model=None, config=None):
+    """
+    Builds the configured backend. `model` is the loaded Keras model and is
+    only required for the keras backend. Call `configure_threads()` before
+    loading the model if thread counts should apply to it.
+    """
+    config = {**default_config(), **(config or {})}
+    if config["backend"] == "tflite":
+        backend = TFLiteBackend(config["tflite_path"], num_threads=config["intra_op_threads"])
+    elif config["backend"] == "keras":
+        if model is None:
+            raise ValueError("The keras backend needs a loaded model.")
+        backend = KerasBackend(model)
+    else:
+        raise ValueError(f"Unknown inference backend: {config['backend']!r}")
+    if config["cascade_model"]:
+        import cascade
+
+        backend = cascade.wrap_if_configured(backend, config)
+    if config["warmup"]:
+        backend.warmup()
+    return backend
+
+def export_tflite(model, path=DEFAULT_TFLITE_PATH):
+    """
+    Converts the Keras model to a float32 .tflite file.
+    """
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    with open(path, "wb") as f:
+        f.write(converter.convert())
+    return path
+
+# --- 3. LATENCY REPORT ---
+def measure_latency(predict_fn, runs=100, batch_size=1):
+    """
+    Times `predict_fn` on random inputs and returns latency percentiles in milliseconds.
+    """
+    batch = np.random.default_rng(0).random((batch_size,) + INPUT_SHAPE, dtype=np.float32)
+    predict_fn(batch)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        predict_fn(batch)
+        timings.append((time.perf_counter() - start) * 1000)
+    p50, p90, p99 = np.percentile(timings, [50, 90, 99])
+    return {"p50_ms": p50, "p90_ms": p90, "p99_ms": p99}
+
+def main():
+    import inference
+
+    parser = argparse.ArgumentParser(description="Report single-image latency for each inference backend.")
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--tflite", default=DEFAULT_TFLITE_PATH, help="TFLite model to include in the report.")
+    parser.add_argument("--export-tflite", action="store_true", help="Convert the Keras model to --tflite first.")
+    args = parser.parse_args()
+
+    config = default_config()
+    configure_threads(config["intra_op_threads"], config["inter_op_threads"])
+    model = inference.load_keras_model()
+    if args.export_tflite:
+        export_tflite(model, args.tflite)
+
+    results = {"model.predict": measure_latency(lambda x: model.predict(x, verbose=0), args.runs)}
+    keras_backend = create_backend(model, {"backend": "keras", "cascade_model": None})
+    results["keras"] = measure_latency(keras_backend.predict, args.runs)
+    if os.path.exists(args.tflite):
+        backend = create_backend(config={"backend": "tflite", "tflite_path": args.tflite, "cascade_model": None})
+        results["tflite"] = measure_latency(backend.predict, args.runs)
+
+    for name, stats in results.items():
+        print(f"{name:<14} p50 {stats['p50_ms']:8.2f} ms   p90 {stats['p90_ms']:8.2f} ms   p99 {stats['p99_ms']:8.2f} ms")
+
+if __name__ == "__main__":
+    main()
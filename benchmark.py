@@ -0,0 +1,312 @@
+"""
+Benchmark suite for the decode, preprocessing and inference stages.
+
+Generates synthetic JPEG/PNG leaf-sized photos at phone resolutions, then
+reports latency percentiles per stage, model throughput per batch size and
+the memory each stage adds. Runs against `final_model.keras` or, with
+`--model standin`, a small randomly initialised Keras model with the same
+128x128x3 -> 15-class signature, so it works in CI without downloading the
+real model.
+
+Memory is measured per stage in a fresh process that reads a pre-generated
+input file, so the numbers cover decoding, preprocessing or inference alone
+and not the synthetic image generator or earlier stages.
+
+Results are written as JSON. Pass a previous results file with `--baseline`
+to exit non-zero when any stage's latency or memory regresses by more than
+`--threshold`.
+
+Usage:
+    python benchmark.py --model standin -o bench.json
+    python benchmark.py --model standin --baseline bench.json --threshold 0.15
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+import backends
+import inference
+import preprocessing
+
+DEFAULT_RESOLUTIONS = "4032x3024,8064x6048"
+DEFAULT_FORMATS = "jpeg,png"
+DEFAULT_BATCH_SIZES = "1,8,32"
+# Memory growth below this is treated as noise when comparing against a baseline.
+RSS_SLACK_MB = 8.0
+
+# --- 1. INPUTS ---
+def build_standin_model(num_classes=None):
+    """
+    Builds a small CNN with the production input/output signature.
+    """
+    import tensorflow as tf
+
+    if num_classes is None:
+        num_classes = len(inference.load_labels())
+    return tf.keras.Sequential([
+        tf.keras.Input(shape=backends.INPUT_SHAPE),
+        tf.keras.layers.Conv2D(16, 3, strides=2, activation="relu"),
+        tf.keras.layers.Conv2D(32, 3, strides=2, activation="relu"),
+        tf.keras.layers.Conv2D(64, 3, strides=2, activation="relu"),
+        tf.keras.layers.GlobalAveragePooling2D(),
+        tf.keras.layers.Dense(64, activation="relu"),
+        tf.keras.layers.Dense(num_classes, activation="softmax"),
+    ])
+
+def synthetic_image(width, height, fmt, seed=0):
+    """
+    Encodes a leaf-like synthetic photo: smooth green gradients with spots and
+    sensor noise, so JPEG/PNG sizes are closer to real photos than pure noise.
+    """
+    rng = np.random.default_rng(seed)
+    # Build at 1/8 scale and upsample so encoding time, not generation, dominates.
+    small_w, small_h = max(width // 8, 1), max(height // 8, 1)
+    y, x = np.mgrid[0:small_h, 0:small_w].astype(np.float32)
+    base = np.stack([
+        60 + 40 * np.sin(x / 37.0),
+        140 + 50 * np.cos(y / 53.0),
+        50 + 30 * np.sin((x + y) / 71.0),
+    ], axis=-1)
+    for _ in range(20):
+        cx, cy, r = rng.integers(0, small_w), rng.integers(0, small_h), rng.integers(3, 20)
+        base[(x - cx) ** 2 + (y - cy) ** 2 < r ** 2] = (110, 80, 40)
+    img = Image.fromarray(np.clip(base, 0, 255).astype(np.uint8)).resize((width, height), Image.BILINEAR)
+    noisy = np.asarray(img, dtype=np.int16) + rng.integers(-8, 9, size=(height, width, 3), dtype=np.int16)
+    img = Image.fromarray(np.clip(noisy, 0, 255).astype(np.uint8))
+    buf = io.BytesIO()
+    img.save(buf, format=fmt.upper(), **({"quality": 90} if fmt == "jpeg" else {}))
+    return buf.getvalue()
+
+# --- 2. MEASUREMENT ---
+def percentiles(timings_ms):
+    p50, p90, p99 = np.percentile(timings_ms, [50, 90, 99])
+    return {"p50_ms": float(p50), "p90_ms": float(p90), "p99_ms": float(p99), "runs": len(timings_ms)}
+
+def time_stage(fn, runs):
+    """
+    Calls `fn` once to warm up, then `runs` times, returning latency percentiles.
+    """
+    fn()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return percentiles(timings)
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _proc_status_mb(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    raise OSError(f"{field} not in /proc/self/status")
+
+def measure_rss(fn):
+    """
+    Calls `fn` and returns the process's peak RSS and how far it rose above
+    the RSS before the call. On Linux the peak is reset first, so an earlier
+    transient peak (e.g. during imports) can't hide the stage's own peak.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        before = _proc_status_mb("VmRSS")
+        fn()
+        after = _proc_status_mb("VmHWM")
+    except OSError:
+        before = peak_rss_mb()
+        fn()
+        after = peak_rss_mb()
+    return {"peak_rss_mb": after, "stage_rss_mb": max(after - before, 0.0)}
+
+def image_stages(data):
+    """
+    Returns {stage: callable} for full-resolution and draft-mode decoding plus
+    preprocessing of one encoded image.
+    """
+    decoded = preprocessing.open_image(io.BytesIO(data))
+    preprocessor = preprocessing.Preprocessor()
+    return {
+        "decode_full": lambda: Image.open(io.BytesIO(data)).convert("RGB"),
+        "decode_draft": lambda: preprocessing.open_image(io.BytesIO(data)),
+        "preprocess": lambda: preprocessor.batch([decoded]),
+        "end_to_end": lambda: preprocessor.batch([preprocessing.open_image(io.BytesIO(data))]),
+    }
+
+def bench_image_stages(data, runs):
+    """
+    Times each image stage for one encoded image.
+    """
+    return {stage: time_stage(fn, runs) for stage, fn in image_stages(data).items()}
+
+def _image_stage_rss(path, stage):
+    # Runs in a fresh process; reading the file and setup happen before measuring.
+    with open(path, "rb") as f:
+        fn = image_stages(f.read())[stage]
+    return measure_rss(fn)
+
+def _inference_rss(model_arg, batch_size):
+    backend = create_benchmark_backend(model_arg)
+    batch = np.random.default_rng(0).random((batch_size,) + backends.INPUT_SHAPE, dtype=np.float32)
+    backend.predict(batch[:1])
+    return measure_rss(lambda: backend.predict(batch))
+
+def in_fresh_process(fn, *args):
+    """
+    Runs `fn(*args)` in a newly spawned interpreter, so its peak RSS isn't
+    inflated by anything this process has done.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(fn, *args).result()
+
+def measure_image_memory(path):
+    """
+    Returns {stage: peak and added RSS} for one encoded image file.
+    """
+    return {
+        stage: in_fresh_process(_image_stage_rss, path, stage)
+        for stage in ("decode_full", "decode_draft", "end_to_end")
+    }
+
+def bench_inference(backend, batch_sizes, runs):
+    """
+    Times the backend at each batch size and derives throughput in images/second.
+    """
+    results = {}
+    rng = np.random.default_rng(0)
+    for batch_size in batch_sizes:
+        batch = rng.random((batch_size,) + backends.INPUT_SHAPE, dtype=np.float32)
+        stats = time_stage(lambda: backend.predict(batch), runs)
+        stats["images_per_s"] = batch_size / (stats["p50_ms"] / 1000)
+        results[str(batch_size)] = stats
+    return results
+
+def create_benchmark_backend(model_arg):
+    """
+    Returns a Keras backend for "standin" or a path to a .keras model.
+    """
+    model = build_standin_model() if model_arg == "standin" else inference.load_keras_model(model_arg)
+    return backends.create_backend(model, {"backend": "keras", "cascade_model": None})
+
+def run_benchmarks(args):
+    backend = create_benchmark_backend(args.model)
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+
+    results = {
+        "meta": {
+            "model": args.model,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "runs": args.runs,
+            "timestamp": time.time(),
+        },
+        "stages": {},
+        "inference": bench_inference(backend, batch_sizes, args.runs),
+        "memory": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for resolution in args.resolutions.split(","):
+            width, height = (int(v) for v in resolution.lower().split("x"))
+            for fmt in args.formats.split(","):
+                data = synthetic_image(width, height, fmt)
+                for stage, stats in bench_image_stages(data, args.runs).items():
+                    results["stages"][f"{stage}/{fmt}/{resolution}"] = stats
+                if args.memory:
+                    path = os.path.join(tmp_dir, f"{resolution}.{fmt}")
+                    with open(path, "wb") as f:
+                        f.write(data)
+                    for stage, stats in measure_image_memory(path).items():
+                        results["memory"][f"{stage}/{fmt}/{resolution}"] = stats
+    if args.memory:
+        results["memory"][f"inference/batch{max(batch_sizes)}"] = in_fresh_process(
+            _inference_rss, args.model, max(batch_sizes)
+        )
+    return results
+
+# --- 3. REPORTING ---
+def compare(results, baseline, threshold):
+    """
+    Returns a list of regressions: stages whose p50 latency or added memory
+    grew, or batch sizes whose throughput dropped, by more than `threshold`
+    (a fraction). Memory growth under RSS_SLACK_MB is ignored as noise.
+    """
+    regressions = []
+    for name, stats in results["stages"].items():
+        old = baseline.get("stages", {}).get(name)
+        if old and stats["p50_ms"] > old["p50_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p50 {old['p50_ms']:.2f} ms -> {stats['p50_ms']:.2f} ms")
+    for batch_size, stats in results["inference"].items():
+        old = baseline.get("inference", {}).get(batch_size)
+        if old and stats["images_per_s"] < old["images_per_s"] * (1 - threshold):
+            regressions.append(
+                f"inference batch {batch_size}: {old['images_per_s']:.1f} -> {stats['images_per_s']:.1f} img/s"
+            )
+    for name, stats in results.get("memory", {}).items():
+        old = baseline.get("memory", {}).get(name)
+        if old and stats["stage_rss_mb"] > max(old["stage_rss_mb"] * (1 + threshold), old["stage_rss_mb"] + RSS_SLACK_MB):
+            regressions.append(f"{name}: memory {old['stage_rss_mb']:.1f} MB -> {stats['stage_rss_mb']:.1f} MB")
+    return regressions
+
+def print_report(results):
+    print(f"{'stage':<40} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10}")
+    for name, stats in results["stages"].items():
+        print(f"{name:<40} {stats['p50_ms']:>10.2f} {stats['p90_ms']:>10.2f} {stats['p99_ms']:>10.2f}")
+    print(f"\n{'batch size':<12} {'p50 ms':>10} {'img/s':>10}")
+    for batch_size, stats in results["inference"].items():
+        print(f"{batch_size:<12} {stats['p50_ms']:>10.2f} {stats['images_per_s']:>10.1f}")
+    if results.get("memory"):
+        print(f"\n{'stage (fresh process)':<40} {'added MB':>10} {'peak MB':>10}")
+        for name, stats in results["memory"].items():
+            print(f"{name:<40} {stats['stage_rss_mb']:>10.1f} {stats['peak_rss_mb']:>10.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark decode, preprocessing and inference.")
+    parser.add_argument("--model", default="standin", help='"standin" or a path to a .keras model.')
+    parser.add_argument("--resolutions", default=DEFAULT_RESOLUTIONS, help="Comma-separated WIDTHxHEIGHT list.")
+    parser.add_argument("--formats", default=DEFAULT_FORMATS, help="Comma-separated list of jpeg/png.")
+    parser.add_argument("--batch-sizes", default=DEFAULT_BATCH_SIZES)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="Skip the per-stage memory measurements (one process per stage).")
+    parser.add_argument("-o", "--output", help="Write results as JSON to this file.")
+    parser.add_argument("--baseline", help="Previous results JSON to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed regression as a fraction (0.10 = 10%%).")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args)
+    print_report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Headless bulk scoring of image directories.
+
+Decodes images in a worker pool, feeds fixed-size batches to the model while
+the next batches are being decoded, and streams one result per image to a
+JSONL or CSV file. Progress is checkpointed after every batch so an
+interrupted run can be resumed where it stopped.
+
+Usage:
+    python bulk_score.py images/ -o results.jsonl
+    python bulk_score.py --file-list paths.txt -o results.csv --batch-size 64
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+import inference
+import metrics
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+CSV_FIELDS = ["path", "label", "confidence", "error"]
+
+# --- 1. INPUT DISCOVERY ---
+def find_images(root):
+    """
+    Recursively lists image files under `root` in a stable, sorted order.
+    """
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(dirpath, name))
+    return paths
+
+def read_file_list(list_path):
+    """
+    Reads one image path per line, ignoring blank lines and # comments.
+    """
+    with open(list_path, "r") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+def inputs_digest(paths):
+    """
+    Fingerprints the ordered input list so a checkpoint is only reused for the same inputs.
+    """
+    h = hashlib.sha256()
+    for p in paths:
+        h.update(p.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+# --- 2. CHECKPOINTING ---
+def load_checkpoint(checkpoint_path, digest):
+    """
+    Returns the saved checkpoint, or None if there is none or it belongs to another input list.
+    """
+    if not os.path.exists(checkpoint_path):
+        return None
+    with open(checkpoint_path, "r") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("inputs_digest") != digest:
+        raise SystemExit(
+            f"Checkpoint {checkpoint_path} was written for a different input list; "
+            "pass --restart to discard it."
+        )
+    return checkpoint
+
+def save_checkpoint(checkpoint_path, checkpoint):
+    """
+    Atomically replaces the checkpoint file.
+    """
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, checkpoint_path)
+
+# --- 3. OUTPUT WRITERS ---
+class ResultWriter:
+    """
+    Appends result rows to a JSONL or CSV file, starting from a known byte offset.
+    """
+
+    def __init__(self, path, fmt, offset=0):
+        self.fmt = fmt
+        if offset and (not os.path.exists(path) or os.path.getsize(path) < offset):
+            # The rows the checkpoint counts as done are gone; resuming would skip them.
+            raise SystemExit(
+                f"Output {path} is missing or shorter than the checkpoint expects; "
+                "pass --restart to score everything again."
+            )
+        self.f = open(path, "r+" if offset else "w", newline="", encoding="utf-8")
+        # Anything past the checkpointed offset belongs to a batch that never completed.
+        self.f.seek(offset)
+        self.f.truncate()
+        self.csv = csv.DictWriter(self.f, fieldnames=CSV_FIELDS) if fmt == "csv" else None
+        if self.csv and offset == 0:
+            self.csv.writeheader()
+
+    def write(self, row):
+        if self.csv:
+            self.csv.writerow(row)
+        else:
+            self.f.write(json.dumps(row) + "\n")
+
+    def sync(self):
+        """
+        Flushes rows to disk and returns the current offset for the checkpoint.
+        """
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        return self.f.tell()
+
+    def close(self):
+        self.f.close()
+
+# --- 4. PIPELINE ---
+def decode_batches(paths, batch_size, executor, out_queue, stop_event):
+    """
+    Producer: decodes `paths` batch by batch in the worker pool and puts each
+    batch's list of (path, array, error) tuples onto `out_queue`. The bounded queue is what lets
+    decoding run ahead of inference by a fixed number of batches.
+    """
+    try:
+        for start in range(0, len(paths), batch_size):
+            if stop_event.is_set():
+                return
+            chunk = paths[start:start + batch_size]
+            out_queue.put(list(executor.map(inference.load_and_preprocess, chunk)))
+    except BaseException as e:
+        out_queue.put(e)
+    finally:
+        out_queue.put(None)
+
+def score_batch(backend, labels, decoded, batch_size):
+    """
+    Runs one decoded batch through the backend and returns its result rows.
+    Short or partially failed batches are zero-padded to `batch_size` so the
+    model always sees the same input shape.
+    """
+    ok = [(i, arr) for i, (_, arr, _) in enumerate(decoded) if arr is not None]
+    probabilities = {}
+    if ok:
+        batch = np.zeros((batch_size,) + ok[0][1].shape, dtype=np.float32)
+        for slot, (_, arr) in enumerate(ok):
+            batch[slot] = arr
+        with metrics.timed("model"):
+            predictions = backend.predict(batch)[:len(ok)]
+        probabilities = {i: p for (i, _), p in zip(ok, predictions)}
+
+    rows = []
+    for i, (path, _, error) in enumerate(decoded):
+        row = {"path": path, "label": None, "confidence": None, "error": error}
+        if i in probabilities:
+            p = probabilities[i]
+            class_index = int(np.argmax(p))
+            row["label"] = labels[class_index]
+            row["confidence"] = float(p[class_index])
+            metrics.record_prediction(row["label"], row["confidence"])
+        rows.append(row)
+    return rows
+
+def run(paths, output, fmt, checkpoint_path, batch_size, workers, use_processes, prefetch, restart):
+    """
+    Scores `paths` and streams results to `output`, resuming from `checkpoint_path` if possible.
+    """
+    digest = inputs_digest(paths)
+    checkpoint = None if restart else load_checkpoint(checkpoint_path, digest)
+    done = checkpoint["done"] if checkpoint else 0
+    offset = checkpoint["offset"] if checkpoint else 0
+    if done:
+        print(f"Resuming after {done} of {len(paths)} images", file=sys.stderr)
+    remaining = paths[done:]
+    if not remaining:
+        print("Nothing to do.", file=sys.stderr)
+        return
+
+    # Open the output first so a bad resume fails before the model is loaded.
+    writer = ResultWriter(output, fmt, offset)
+    backend = inference.load_backend()
+    labels = inference.load_labels()
+
+    pool_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    batches = queue.Queue(maxsize=prefetch)
+    stop_event = threading.Event()
+    started = time.perf_counter()
+    scored = 0
+
+    with pool_cls(max_workers=workers) as executor:
+        producer = threading.Thread(
+            target=decode_batches,
+            args=(remaining, batch_size, executor, batches, stop_event),
+            daemon=True
+        )
+        producer.start()
+        try:
+            while True:
+                decoded = batches.get()
+                if decoded is None:
+                    break
+                if isinstance(decoded, BaseException):
+                    raise decoded
+                for row in score_batch(backend, labels, decoded, batch_size):
+                    writer.write(row)
+                done += len(decoded)
+                scored += len(decoded)
+                save_checkpoint(checkpoint_path, {
+                    "inputs_digest": digest,
+                    "done": done,
+                    "offset": writer.sync(),
+                    "total": len(paths),
+                })
+                rate = scored / (time.perf_counter() - started)
+                print(f"\r{done}/{len(paths)} images ({rate:.1f} img/s)", end="", file=sys.stderr)
+        finally:
+            stop_event.set()
+            # Unblock the producer if it is waiting on a full queue.
+            while producer.is_alive():
+                try:
+                    batches.get_nowait()
+                except queue.Empty:
+                    producer.join(timeout=0.1)
+            writer.close()
+    print(file=sys.stderr)
+
+# --- 5. COMMAND LINE ---
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Score a directory of leaf images in bulk.")
+    parser.add_argument("input_dir", nargs="?", help="Directory to scan recursively for images.")
+    parser.add_argument("--file-list", help="Text file with one image path per line (instead of input_dir).")
+    parser.add_argument("-o", "--output", required=True, help="Output file (.jsonl or .csv).")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="Output format (default: from the output extension).")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <output>.ckpt).")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Decode workers.")
+    parser.add_argument("--processes", action="store_true", help="Decode in processes instead of threads.")
+    parser.add_argument("--prefetch", type=int, default=4, help="Decoded batches to keep ready ahead of the model.")
+    parser.add_argument("--restart", action="store_true", help="Ignore any existing checkpoint and start over.")
+    args = parser.parse_args(argv)
+    if bool(args.input_dir) == bool(args.file_list):
+        parser.error("pass exactly one of input_dir or --file-list")
+    if args.format is None:
+        args.format = "csv" if args.output.lower().endswith(".csv") else "jsonl"
+    if args.checkpoint is None:
+        args.checkpoint = args.output + ".ckpt"
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = read_file_list(args.file_list) if args.file_list else find_images(args.input_dir)
+    run(
+        paths,
+        output=args.output,
+        fmt=args.format,
+        checkpoint_path=args.checkpoint,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        use_processes=args.processes,
+        prefetch=args.prefetch,
+        restart=args.restart,
+    )
+
+if __name__ == "__main__":
+    main()
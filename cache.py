@@ -0,0 +1,202 @@
+"""
+Content-addressed prediction cache.
+
+Results are keyed by the SHA-256 of the uploaded image bytes and namespaced by
+a digest of the served model files and the label file, so re-uploads of the same photo skip
+decoding and inference entirely. There are two tiers:
+
+- a bounded in-process LRU, shared by every Streamlit session in the process;
+- an optional SQLite database, so results survive restarts.
+
+Before every lookup the cache re-stats the model and label files; if any
+has changed, the digest is recomputed and all entries from the old namespace
+are dropped from both tiers.
+
+    PLANT_CACHE_SIZE   entries kept in memory (default 1024, 0 disables the cache)
+    PLANT_CACHE_DB     path of the SQLite tier (unset = memory only)
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 1024
+
+def hash_bytes(data):
+    """
+    Returns the hex SHA-256 digest of `data`.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+def file_digest(path, chunk_size=1 << 20):
+    """
+    Returns the hex SHA-256 digest of a file, read in chunks.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+class FileFingerprint:
+    """
+    Combined digest of a set of files that is only recomputed when one of
+    the files' size or modification time changes.
+    """
+
+    def __init__(self, paths):
+        self.paths = list(paths)
+        self._stat = None
+        self._digest = None
+
+    def _stat_key(self):
+        key = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                key.append((path, st.st_size, st.st_mtime_ns))
+            except FileNotFoundError:
+                key.append((path, None, None))
+        return tuple(key)
+
+    @property
+    def complete(self):
+        """
+        True if every file exists.
+        """
+        return all(size is not None for _, size, _ in self._stat_key())
+
+    @property
+    def digest(self):
+        stat = self._stat_key()
+        if stat != self._stat:
+            h = hashlib.sha256()
+            for path, size, _ in stat:
+                h.update(path.encode("utf-8"))
+                h.update(file_digest(path).encode("ascii") if size is not None else b"missing")
+            self._stat = stat
+            self._digest = h.hexdigest()
+        return self._digest
+
+class PredictionCache:
+    """
+    Two-tier cache of JSON-serializable prediction results keyed by image bytes.
+    Safe to share between threads.
+    """
+
+    def __init__(self, fingerprint, max_entries=DEFAULT_MAX_ENTRIES, db_path=None):
+        self.fingerprint = fingerprint
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._namespace = None
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "key TEXT PRIMARY KEY, namespace TEXT NOT NULL, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def _check_namespace(self):
+        """
+        Drops every entry if the model or label files changed since the last
+        call. Returns False, leaving both tiers alone, while one of the files
+        is missing (e.g. the model hasn't been downloaded yet after a restart).
+        Must be called with the lock held.
+        """
+        if not self.fingerprint.complete:
+            return False
+        namespace = self.fingerprint.digest
+        if namespace != self._namespace:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM predictions WHERE namespace != ?", (namespace,))
+                self._db.commit()
+            self._namespace = namespace
+        return True
+
+    def get(self, image_bytes):
+        """
+        Returns the cached result for these image bytes, or None on a miss.
+        """
+        key = hash_bytes(image_bytes)
+        with self._lock:
+            if not self._check_namespace():
+                self.misses += 1
+                return None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value FROM predictions WHERE key = ? AND namespace = ?",
+                    (key, self._namespace)
+                ).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    self._remember(key, value)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, image_bytes, value):
+        """
+        Stores a result for these image bytes in both tiers.
+        """
+        key = hash_bytes(image_bytes)
+        with self._lock:
+            if not self._check_namespace():
+                return
+            self._remember(key, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO predictions (key, namespace, value, created) VALUES (?, ?, ?, ?)",
+                    (key, self._namespace, json.dumps(value), time.time())
+                )
+                self._db.commit()
+
+    def _remember(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        """
+        Returns hit/miss counters and the number of in-memory entries.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+def create_cache(model_paths, labels_path):
+    """
+    Builds the prediction cache from PLANT_CACHE_SIZE / PLANT_CACHE_DB,
+    namespaced by the given model files and label file, or returns None if
+    the cache is disabled.
+    """
+    max_entries = int(os.environ.get("PLANT_CACHE_SIZE", DEFAULT_MAX_ENTRIES))
+    if max_entries <= 0:
+        return None
+    return PredictionCache(
+        FileFingerprint([*model_paths, labels_path]),
+        max_entries=max_entries,
+        db_path=os.environ.get("PLANT_CACHE_DB") or None
+    )
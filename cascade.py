@@ -0,0 +1,263 @@
+"""
+Confidence-gated model cascade: a small, fast classifier answers the clear
+cases and the full model is only run on the images it is unsure about.
+
+An image is escalated to the full model when the cheap model's top-1
+confidence is below `confidence_threshold` or its margin over the runner-up
+is below `margin_threshold`. Enable it for the app and services with:
+
+    PLANT_CASCADE_MODEL        cheap model (.keras or .tflite) over the same 15 classes
+    PLANT_CASCADE_CONFIDENCE   top-1 confidence threshold (default 0.9)
+    PLANT_CASCADE_MARGIN       top-1 minus top-2 threshold (default 0.0)
+
+The command line trains a cheap model and sweeps the threshold on a labeled
+directory (one sub-directory per class) to pick an operating point:
+
+    python cascade.py train --data train_images/ --output cheap_model.keras
+    python cascade.py evaluate --data validation_images/ --cheap cheap_model.keras
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+import backends
+import metrics
+
+DEFAULT_CONFIDENCE_THRESHOLD = backends.DEFAULT_CASCADE_CONFIDENCE
+DEFAULT_MARGIN_THRESHOLD = backends.DEFAULT_CASCADE_MARGIN
+
+ROUTES = metrics.REGISTRY.register(metrics.Counter(
+    "plant_cascade_route_total",
+    "Images answered by each stage of the model cascade.",
+    ("route",)
+))
+
+# --- 1. BACKEND ---
+def top_two(probabilities):
+    """
+    Returns (top-1 confidence, top-1 minus top-2 margin) for each row.
+    """
+    ordered = np.sort(probabilities, axis=1)
+    top1 = ordered[:, -1]
+    top2 = ordered[:, -2] if ordered.shape[1] > 1 else np.zeros_like(top1)
+    return top1, top1 - top2
+
+class CascadeBackend(backends.InferenceBackend):
+    """
+    Runs `cheap` on every image and `full` only on the images where the
+    cheap model's confidence or margin falls below the thresholds.
+    """
+    name = "cascade"
+
+    def __init__(self, cheap, full, confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD,
+                 margin_threshold=DEFAULT_MARGIN_THRESHOLD):
+        self.cheap = cheap
+        self.full = full
+        self.confidence_threshold = confidence_threshold
+        self.margin_threshold = margin_threshold
+
+    def escalate(self, probabilities):
+        confidence, margin = top_two(probabilities)
+        return (confidence < self.confidence_threshold) | (margin < self.margin_threshold)
+
+    def predict_routed(self, batch):
+        """
+        Returns (probabilities, routes), where each route records which model
+        answered, the cheap model's confidence and margin, and the thresholds.
+        """
+        batch = np.asarray(batch, dtype=np.float32)
+        with metrics.timed("cascade_cheap"):
+            probabilities = np.array(self.cheap.predict(batch), dtype=np.float32)
+        confidence, margin = top_two(probabilities)
+        escalate = self.escalate(probabilities)
+        if escalate.any():
+            with metrics.timed("cascade_full"):
+                probabilities[escalate] = self.full.predict(batch[escalate])
+        routes = []
+        for escalated, c, m in zip(escalate, confidence, margin):
+            route = "full" if escalated else "cheap"
+            ROUTES.inc(route=route)
+            routes.append({
+                "route": route,
+                "cheap_confidence": float(c),
+                "cheap_margin": float(m),
+                "confidence_threshold": self.confidence_threshold,
+                "margin_threshold": self.margin_threshold,
+            })
+        return probabilities, routes
+
+    def predict(self, batch):
+        return self.predict_routed(batch)[0]
+
+    def predict_with_embeddings(self, batch):
+        # Stored embeddings come from the full model, so queries must too.
+        return self.full.predict_with_embeddings(batch)
+
+    def predict_with_embeddings_routed(self, batch):
+        """
+        Returns (probabilities, embeddings, routes) from a single pass of the
+        full model, which is needed for the embedding anyway, so its answer
+        is used instead of running the cheap model as well.
+        """
+        probabilities, embeddings = self.full.predict_with_embeddings(batch)
+        routes = []
+        for _ in range(len(probabilities)):
+            ROUTES.inc(route="embedding")
+            routes.append({
+                "route": "embedding",
+                "confidence_threshold": self.confidence_threshold,
+                "margin_threshold": self.margin_threshold,
+            })
+        return probabilities, embeddings, routes
+
+    def warmup(self, batch_size=1):
+        self.cheap.warmup(batch_size)
+        self.full.warmup(batch_size)
+
+def load_cheap_backend(path, num_threads=None):
+    """
+    Loads the cheap model as a TFLite or compiled Keras backend, by extension.
+    """
+    if path.endswith(".tflite"):
+        return backends.TFLiteBackend(path, num_threads=num_threads)
+    from tensorflow.keras.models import load_model
+
+    return backends.KerasBackend(load_model(path))
+
+def wrap_if_configured(full, config):
+    """
+    Wraps `full` in a cascade if the config names a cheap model.
+    """
+    if not config.get("cascade_model"):
+        return full
+    return CascadeBackend(
+        load_cheap_backend(config["cascade_model"], config.get("intra_op_threads")),
+        full,
+        confidence_threshold=config["cascade_confidence"],
+        margin_threshold=config["cascade_margin"]
+    )
+
+# --- 2. TRAINING A CHEAP MODEL ---
+def train(data_dir, output, epochs=10, batch_size=32):
+    """
+    Trains the small stand-in architecture from benchmark.py on a labeled
+    directory, with classes ordered exactly as in class_indices.json.
+    """
+    import tensorflow as tf
+
+    import benchmark
+    import inference
+
+    labels = inference.load_labels()
+    class_names = [labels[i] for i in sorted(labels)]
+    dataset = tf.keras.utils.image_dataset_from_directory(
+        data_dir,
+        class_names=class_names,
+        image_size=inference.IMG_SIZE,
+        batch_size=batch_size,
+        validation_split=0.1,
+        subset="both",
+        seed=0
+    )
+    scale = lambda x, y: (x / 255.0, y)
+    train_ds, val_ds = (d.map(scale).prefetch(tf.data.AUTOTUNE) for d in dataset)
+    model = benchmark.build_standin_model(len(class_names))
+    model.compile(optimizer="adam", loss="sparse_categorical_crossentropy", metrics=["accuracy"])
+    model.fit(train_ds, validation_data=val_ds, epochs=epochs)
+    model.save(output)
+    return output
+
+# --- 3. THRESHOLD SWEEP ---
+def sweep(cheap_probs, full_probs, targets, cheap_ms, full_ms, thresholds, margin_threshold=0.0):
+    """
+    For each confidence threshold, returns the cascade's accuracy, the share
+    of images escalated and the average compute per image (cheap model
+    always, full model when escalated).
+    """
+    cheap_pred = np.argmax(cheap_probs, axis=1)
+    full_pred = np.argmax(full_probs, axis=1)
+    confidence, margin = top_two(cheap_probs)
+    rows = []
+    for threshold in thresholds:
+        escalate = (confidence < threshold) | (margin < margin_threshold)
+        predictions = np.where(escalate, full_pred, cheap_pred)
+        avg_ms = cheap_ms + escalate.mean() * full_ms
+        rows.append({
+            "confidence_threshold": float(threshold),
+            "accuracy": float((predictions == targets).mean()),
+            "escalated": float(escalate.mean()),
+            "avg_ms": float(avg_ms),
+            "relative_compute": float(avg_ms / full_ms),
+        })
+    return rows
+
+def evaluate(args):
+    import inference
+    import optimize_model
+
+    labels = inference.load_labels()
+    images, targets = optimize_model.load_labeled_images(args.data, labels, args.limit_per_class)
+    cheap = load_cheap_backend(args.cheap)
+    full = inference.load_backend({"cascade_model": None}, use_model_server=False)
+
+    def predict_all(backend):
+        return np.concatenate([backend.predict(images[i:i + 32]) for i in range(0, len(images), 32)])
+
+    cheap_probs, full_probs = predict_all(cheap), predict_all(full)
+    cheap_ms = backends.measure_latency(cheap.predict, runs=args.latency_runs)["p50_ms"]
+    full_ms = backends.measure_latency(full.predict, runs=args.latency_runs)["p50_ms"]
+    thresholds = np.round(np.arange(args.min_threshold, args.max_threshold + 1e-9, args.step), 4)
+    rows = sweep(cheap_probs, full_probs, targets, cheap_ms, full_ms, thresholds, args.margin)
+
+    full_accuracy = float((np.argmax(full_probs, axis=1) == targets).mean())
+    cheap_accuracy = float((np.argmax(cheap_probs, axis=1) == targets).mean())
+    print(f"{len(images)} images; full model {full_accuracy:.4f} @ {full_ms:.2f} ms, "
+          f"cheap model {cheap_accuracy:.4f} @ {cheap_ms:.2f} ms\n")
+    print(f"{'threshold':>9} {'accuracy':>9} {'escalated':>10} {'avg ms':>8} {'compute':>8}")
+    for row in rows:
+        print(f"{row['confidence_threshold']:>9.3f} {row['accuracy']:>9.4f} {row['escalated']:>10.1%} "
+              f"{row['avg_ms']:>8.2f} {row['relative_compute']:>8.1%}")
+
+    acceptable = [r for r in rows if full_accuracy - r["accuracy"] <= args.tolerance]
+    if acceptable:
+        best = min(acceptable, key=lambda r: r["avg_ms"])
+        print(f"\nCheapest threshold within {args.tolerance} of the full model's accuracy: "
+              f"PLANT_CASCADE_CONFIDENCE={best['confidence_threshold']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "full_accuracy": full_accuracy, "cheap_accuracy": cheap_accuracy,
+                "full_ms": full_ms, "cheap_ms": cheap_ms, "margin_threshold": args.margin, "sweep": rows,
+            }, f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and tune the cheap-model cascade.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = sub.add_parser("train", help="Train a small cheap model on a labeled directory.")
+    train_parser.add_argument("--data", required=True)
+    train_parser.add_argument("--output", default="cheap_model.keras")
+    train_parser.add_argument("--epochs", type=int, default=10)
+
+    eval_parser = sub.add_parser("evaluate", help="Sweep the confidence threshold on a labeled directory.")
+    eval_parser.add_argument("--data", required=True)
+    eval_parser.add_argument("--cheap", default=os.environ.get("PLANT_CASCADE_MODEL", "cheap_model.keras"))
+    eval_parser.add_argument("--limit-per-class", type=int)
+    eval_parser.add_argument("--margin", type=float, default=DEFAULT_MARGIN_THRESHOLD)
+    eval_parser.add_argument("--min-threshold", type=float, default=0.5)
+    eval_parser.add_argument("--max-threshold", type=float, default=0.99)
+    eval_parser.add_argument("--step", type=float, default=0.01)
+    eval_parser.add_argument("--tolerance", type=float, default=0.01)
+    eval_parser.add_argument("--latency-runs", type=int, default=50)
+    eval_parser.add_argument("-o", "--output", help="Write the sweep as JSON.")
+
+    args = parser.parse_args()
+    if args.command == "train":
+        train(args.data, args.output, args.epochs)
+    else:
+        evaluate(args)
+
+if __name__ == "__main__":
+    main()
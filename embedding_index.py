@@ -0,0 +1,586 @@
+"""
+Similar-case retrieval over confirmed diagnoses.
+
+Each case is the model's penultimate-layer embedding of a leaf image whose
+diagnosis a user confirmed with the feedback buttons. Vectors are
+L2-normalized and stored as float16 rows in a flat file that is memory-mapped
+for search. The row -> case id/label/metadata table lives in SQLite next to
+it, and an optional inverted file (IVF) groups the rows by nearest centroid:
+
+    <index_dir>/vectors.f16   N x dim float16, row i is case i
+    <index_dir>/cases.db      cases(row, case_id, label, image_path, ...)
+    <index_dir>/ivf.npz       centroids and the rows of each list
+
+Without IVF lists, search is an exact cosine top-k over the memmap in chunks
+of `chunk_rows` rows, so memory is bounded by one chunk but every row is read
+and upcast on every query (about 1.7 ms at 2k x 256 and 110 ms at 100k x 256
+on one core). Once the index has IVF_MIN_ROWS cases, IVF lists are trained
+and search scores only the rows of the `nprobe` lists nearest the query, plus
+rows appended since training (about 3.5 ms and 0.97 recall@5 at 100k x 256
+with nprobe 8; see `python embedding_index.py bench`). The lists are retrained
+in the background by `maybe_train_async()`, which the app calls after each
+append, once the untrained rows exceed RETRAIN_GROWTH of the trained ones;
+`build` and `train` retrain them from the command line.
+Appends write the new rows past the last committed one and then commit their
+metadata while holding SQLite's write lock, so several app workers can append
+concurrently and readers only ever see committed rows.
+
+    PLANT_EMBEDDING_INDEX   index directory (default data/embeddings; empty disables)
+    PLANT_EMBEDDING_NPROBE  IVF lists scored per query (default 8)
+
+Backfill the index from confirmed cases in the prediction log, or query it:
+
+    python embedding_index.py build
+    python embedding_index.py train
+    python embedding_index.py search leaf.jpg -k 5
+    python embedding_index.py bench --rows 100000
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+import backends
+import cache
+
+DEFAULT_INDEX_DIR = os.path.join("data", "embeddings")
+DEFAULT_CHUNK_ROWS = 32768
+VECTOR_DTYPE = np.float16
+DEFAULT_NPROBE = 8
+# Below this many 256-d cases an exact scan takes under 2 ms on one core
+# (measured: 1.7 ms at 2k, 11 ms at 10k, 15 ms at 20k), so no IVF is trained.
+IVF_MIN_ROWS = 2000
+# Retrain once the rows appended since training exceed this fraction of the
+# trained rows, since they are all scanned exactly.
+RETRAIN_GROWTH = 0.2
+# Embeddings are defined as the Keras model's penultimate layer, whatever
+# PLANT_BACKEND serves predictions with.
+EMBEDDING_BACKEND = {"backend": "keras", "cascade_model": None}
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_ROWS = 65536
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cases (
+    row INTEGER PRIMARY KEY,
+    case_id TEXT NOT NULL UNIQUE,
+    label TEXT NOT NULL,
+    image_path TEXT,
+    image_sha256 TEXT,
+    created REAL NOT NULL,
+    metadata TEXT
+);
+CREATE TABLE IF NOT EXISTS info (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+def normalize(vectors):
+    """
+    Scales each row to unit length, so a dot product is a cosine similarity.
+    """
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    vectors = vectors.reshape(len(vectors), -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def assign_lists(vectors, centroids, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Returns the index of the most cosine-similar centroid for each row,
+    reading `vectors` (which may be a memmap) `chunk_rows` rows at a time.
+    """
+    return np.concatenate([
+        np.argmax(np.asarray(vectors[start:start + chunk_rows], dtype=np.float32) @ centroids.T, axis=1)
+        for start in range(0, len(vectors), chunk_rows)
+    ])
+
+def kmeans(vectors, num_lists, iterations=KMEANS_ITERATIONS, seed=0):
+    """
+    Spherical k-means over unit vectors; returns (num_lists, dim) unit centroids.
+    """
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    centroids = vectors[rng.choice(len(vectors), num_lists, replace=False)]
+    for _ in range(iterations):
+        assignment = assign_lists(vectors, centroids)
+        order = np.argsort(assignment, kind="stable")
+        used, starts = np.unique(assignment[order], return_index=True)
+        sums = vectors[rng.choice(len(vectors), num_lists)]  # re-seeds lists that ended up empty
+        sums[used] = np.add.reduceat(vectors[order], starts, axis=0)
+        centroids = normalize(sums)
+    return centroids
+
+def model_fingerprint(model_path=backends.DEFAULT_MODEL_PATH):
+    """
+    Fingerprint of the model that produces the embeddings (the full Keras
+    model, even behind a cascade). Its digest is the index's model digest for
+    both the app and `build`, so cases from one are searchable by the other.
+    """
+    return cache.FileFingerprint([model_path])
+
+class EmbeddingIndex:
+    """
+    Append-only cosine-similarity index over a memory-mapped float16 file,
+    with an optional inverted-file (IVF) coarse quantizer over its rows.
+    """
+
+    def __init__(self, index_dir=DEFAULT_INDEX_DIR, chunk_rows=DEFAULT_CHUNK_ROWS, nprobe=DEFAULT_NPROBE):
+        self.index_dir = index_dir
+        self.chunk_rows = chunk_rows
+        self.nprobe = nprobe
+        self.vectors_path = os.path.join(index_dir, "vectors.f16")
+        self.ivf_path = os.path.join(index_dir, "ivf.npz")
+        self.db_path = os.path.join(index_dir, "cases.db")
+        os.makedirs(index_dir, exist_ok=True)
+        self._local = threading.local()
+        # (rows, memmap) for the committed rows last seen, replaced as a whole.
+        self._view = (0, None)
+        # (file mtime, lists) for the IVF file last loaded, replaced as a whole.
+        self._lists = (None, None)
+        self._training = threading.Lock()
+        self._db().executescript(SCHEMA)
+
+    def _db(self):
+        """
+        Returns this thread's connection; SQLite connections aren't shared across threads.
+        """
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def _info(self, db):
+        return dict(db.execute("SELECT key, value FROM info"))
+
+    @property
+    def dim(self):
+        value = self._info(self._db()).get("dim")
+        return int(value) if value else None
+
+    @property
+    def model_digest(self):
+        return self._info(self._db()).get("model_digest")
+
+    def compatible_with(self, model_digest):
+        """
+        True if the index is empty or was built from the model with this digest.
+        """
+        return self.model_digest in (None, model_digest)
+
+    def __len__(self):
+        return self._db().execute("SELECT COALESCE(MAX(row) + 1, 0) FROM cases").fetchone()[0]
+
+    def __contains__(self, case_id):
+        return self._db().execute("SELECT 1 FROM cases WHERE case_id = ?", (case_id,)).fetchone() is not None
+
+    # --- appends ---
+    def add(self, embeddings, labels, case_ids, image_paths=None, image_shas=None, metadata=None,
+            model_digest=None):
+        """
+        Appends cases and returns how many were added. Case ids that are
+        already indexed are skipped, so re-running a backfill is harmless.
+        Raises ValueError if the embeddings don't match the index's dimension
+        or model.
+        """
+        vectors = normalize(embeddings).astype(VECTOR_DTYPE)
+        count = len(vectors)
+        image_paths = image_paths or [None] * count
+        image_shas = image_shas or [None] * count
+        metadata = metadata or [None] * count
+
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            self._check_compatible(db, vectors.shape[1], model_digest)
+            seen = set()
+            keep = []
+            for i, case_id in enumerate(case_ids):
+                if case_id in seen or db.execute("SELECT 1 FROM cases WHERE case_id = ?", (case_id,)).fetchone():
+                    continue
+                seen.add(case_id)
+                keep.append(i)
+            if not keep:
+                db.execute("COMMIT")
+                return 0
+            start = db.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM cases").fetchone()[0]
+            # Rows past the last committed one are leftovers of a failed append; overwrite them.
+            with open(self.vectors_path, "r+b" if os.path.exists(self.vectors_path) else "wb") as f:
+                f.seek(start * vectors.shape[1] * vectors.itemsize)
+                f.write(vectors[keep].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            now = time.time()
+            db.executemany(
+                "INSERT INTO cases VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (start + n, case_ids[i], labels[i], image_paths[i], image_shas[i], now,
+                     json.dumps(metadata[i]) if metadata[i] is not None else None)
+                    for n, i in enumerate(keep)
+                ]
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return len(keep)
+
+    def _check_compatible(self, db, dim, model_digest):
+        info = self._info(db)
+        if "dim" not in info:
+            db.execute("INSERT INTO info VALUES ('dim', ?)", (str(dim),))
+            if model_digest:
+                db.execute("INSERT INTO info VALUES ('model_digest', ?)", (model_digest,))
+            return
+        if int(info["dim"]) != dim:
+            raise ValueError(f"Embedding index {self.index_dir} holds {info['dim']}-d vectors, got {dim}-d")
+        if model_digest and info.get("model_digest") not in (None, model_digest):
+            raise ValueError(
+                f"Embedding index {self.index_dir} was built with a different model; "
+                "rebuild it with `python embedding_index.py build --rebuild`."
+            )
+
+    # --- search ---
+    def _vectors(self):
+        """
+        Returns a read-only memmap over the committed rows, remapped only
+        when rows have been added since the last call.
+        """
+        rows = len(self)
+        view_rows, view = self._view
+        if rows == 0:
+            return None
+        if view is None or view_rows != rows:
+            view = np.memmap(self.vectors_path, dtype=VECTOR_DTYPE, mode="r", shape=(rows, self.dim))
+            self._view = (rows, view)
+        return view
+
+    # --- coarse quantizer ---
+    def train_ivf(self, num_lists=None, sample_rows=KMEANS_SAMPLE_ROWS, seed=0):
+        """
+        Clusters the committed rows into `num_lists` lists (default sqrt(rows))
+        with k-means on a sample, and writes the centroids and each list's
+        rows to ivf.npz. Rows appended later are scanned exactly until the
+        next call. Returns the number of lists, or 0 for an empty index.
+        """
+        vectors = self._vectors()
+        if vectors is None:
+            return 0
+        rows = len(vectors)
+        num_lists = min(num_lists or max(1, int(np.sqrt(rows))), rows)
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(rows, min(rows, sample_rows), replace=False))
+        centroids = kmeans(vectors[sample], num_lists, seed=seed)
+        assignment = assign_lists(vectors, centroids, self.chunk_rows)
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.searchsorted(assignment[order], np.arange(num_lists + 1))
+        # Several app workers may retrain at once; each writes its own file.
+        tmp_path = f"{self.ivf_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, centroids=centroids, order=order.astype(np.int64), offsets=offsets, rows=rows)
+        os.replace(tmp_path, self.ivf_path)
+        return num_lists
+
+    def needs_training(self):
+        """
+        True if the index has IVF_MIN_ROWS cases and no IVF lists, or the rows
+        appended since the lists were trained exceed RETRAIN_GROWTH of them.
+        """
+        rows = len(self)
+        if rows < IVF_MIN_ROWS:
+            return False
+        lists = self._ivf(rows)
+        trained = int(lists["rows"]) if lists is not None else 0
+        return trained == 0 or rows - trained > RETRAIN_GROWTH * trained
+
+    def maybe_train_async(self):
+        """
+        Retrains the IVF lists on a background thread if `needs_training()`
+        and this process isn't already training. Returns the thread, or None.
+        """
+        if not self._training.acquire(blocking=False):
+            return None
+        if not self.needs_training():
+            self._training.release()
+            return None
+
+        def run():
+            try:
+                self.train_ivf()
+            except Exception as e:
+                print(f"Could not retrain the IVF lists of {self.index_dir}: {e}")
+            finally:
+                self._training.release()
+
+        thread = threading.Thread(target=run, name="ivf-train", daemon=True)
+        thread.start()
+        return thread
+
+    def _ivf(self, rows):
+        """
+        Returns the loaded IVF lists if they were trained on a prefix of the
+        `rows` committed rows with the current dimension, else None.
+        """
+        try:
+            mtime = os.stat(self.ivf_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        loaded_mtime, lists = self._lists
+        if loaded_mtime != mtime:
+            with np.load(self.ivf_path) as data:
+                lists = {name: data[name] for name in data.files}
+            self._lists = (mtime, lists)
+        if int(lists["rows"]) > rows or lists["centroids"].shape[1] != self.dim:
+            return None
+        return lists
+
+    # --- search ---
+    def search(self, queries, k=5, exclude_shas=(), exact=False):
+        """
+        Returns the k most cosine-similar cases for one embedding (a list of
+        dicts with score, row, case_id, label, image_path and metadata), or a
+        list of such lists for a (Q, dim) batch. Cases whose image hash is in
+        `exclude_shas` (typically the query image itself) are left out.
+
+        With IVF lists (see `train_ivf`), only the rows in the `nprobe` lists
+        nearest to the query plus the rows added since training are scored,
+        so results are approximate; `exact=True` scans every row instead.
+        """
+        single = np.ndim(queries) == 1
+        queries = normalize(queries)
+        vectors = self._vectors()
+        if vectors is None:
+            return [] if single else [[] for _ in queries]
+        if queries.shape[1] != vectors.shape[1]:
+            raise ValueError(f"Query has {queries.shape[1]} dimensions, the index has {vectors.shape[1]}")
+
+        # Over-fetch a little so excluded cases don't leave the result short.
+        fetch = min(k + 2 * len(exclude_shas), len(vectors))
+        lists = None if exact else self._ivf(len(vectors))
+        if lists is None:
+            candidates = self._scan(queries, vectors, fetch)
+        else:
+            candidates = self._probe(queries, vectors, lists, fetch)
+
+        cases = self._cases(np.unique(np.concatenate([rows for _, rows in candidates])))
+        results = []
+        for scores, rows in candidates:
+            neighbors = []
+            for score, row in zip(scores, rows):
+                case = cases[int(row)]
+                if case["image_sha256"] is not None and case["image_sha256"] in exclude_shas:
+                    continue
+                neighbors.append({"score": float(score), **case})
+                if len(neighbors) == k:
+                    break
+            results.append(neighbors)
+        return results[0] if single else results
+
+    def _scan(self, queries, vectors, fetch):
+        """
+        Exact top-`fetch` over every row, `chunk_rows` rows at a time.
+        """
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(vectors), self.chunk_rows):
+            chunk = np.asarray(vectors[start:start + self.chunk_rows], dtype=np.float32)
+            scores = np.concatenate([best_scores, queries @ chunk.T], axis=1)
+            rows = np.concatenate([
+                best_rows, np.broadcast_to(np.arange(start, start + len(chunk)), (len(queries), len(chunk)))
+            ], axis=1)
+            if scores.shape[1] > fetch:
+                top = np.argpartition(-scores, fetch - 1, axis=1)[:, :fetch]
+                scores = np.take_along_axis(scores, top, axis=1)
+                rows = np.take_along_axis(rows, top, axis=1)
+            best_scores, best_rows = scores, rows
+        return [_ranked(scores, rows, fetch) for scores, rows in zip(best_scores, best_rows)]
+
+    def _probe(self, queries, vectors, lists, fetch):
+        """
+        Top-`fetch` over the rows of the `nprobe` nearest lists and the rows
+        added since the lists were trained.
+        """
+        centroids, order, offsets = lists["centroids"], lists["order"], lists["offsets"]
+        nprobe = min(self.nprobe, len(centroids))
+        probes = np.argpartition(-(queries @ centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        untrained = np.arange(int(lists["rows"]), len(vectors))
+        candidates = []
+        for query, probe in zip(queries, probes):
+            rows = np.sort(np.concatenate([order[offsets[l]:offsets[l + 1]] for l in probe] + [untrained]))
+            scores = np.asarray(vectors[rows], dtype=np.float32) @ query
+            candidates.append(_ranked(scores, rows, fetch))
+        return candidates
+
+    def _cases(self, rows):
+        placeholders = ",".join("?" * len(rows))
+        query = f"SELECT row, case_id, label, image_path, image_sha256, metadata FROM cases WHERE row IN ({placeholders})"
+        cases = {}
+        for row, case_id, label, image_path, image_sha, metadata in self._db().execute(query, [int(r) for r in rows]):
+            cases[row] = {
+                "row": row,
+                "case_id": case_id,
+                "label": label,
+                "image_path": image_path,
+                "image_sha256": image_sha,
+                "metadata": json.loads(metadata) if metadata else None,
+            }
+        return cases
+
+def _ranked(scores, rows, fetch):
+    """
+    Returns the `fetch` best (scores, rows), best first.
+    """
+    if len(scores) > fetch:
+        top = np.argpartition(-scores, fetch - 1)[:fetch]
+        scores, rows = scores[top], rows[top]
+    order = np.argsort(-scores)
+    return scores[order], rows[order]
+
+def create_index():
+    """
+    Opens the index at PLANT_EMBEDDING_INDEX (default data/embeddings), or
+    returns None if PLANT_EMBEDDING_INDEX is set to an empty string.
+    """
+    index_dir = os.environ.get("PLANT_EMBEDDING_INDEX", DEFAULT_INDEX_DIR)
+    if not index_dir:
+        return None
+    return EmbeddingIndex(index_dir, nprobe=int(os.environ.get("PLANT_EMBEDDING_NPROBE", DEFAULT_NPROBE)))
+
+def benchmark_search(index_dir, rows=100000, dim=256, queries=200, k=5, nprobe=DEFAULT_NPROBE, seed=0):
+    """
+    Fills an index with `rows` clustered synthetic embeddings and returns
+    p50/p90 query latency for the exact scan and for IVF search, and the
+    IVF's recall of the exact top-k.
+    """
+    rng = np.random.default_rng(seed)
+    index = EmbeddingIndex(index_dir, nprobe=nprobe)
+    centers = rng.normal(size=(max(1, rows // 50), dim)).astype(np.float32)
+    for start in range(0, rows, 10000):
+        count = min(10000, rows - start)
+        vectors = centers[rng.integers(len(centers), size=count)] + rng.normal(size=(count, dim)).astype(np.float32)
+        index.add(vectors, ["synthetic"] * count, [str(start + i) for i in range(count)])
+    build_start = time.perf_counter()
+    num_lists = index.train_ivf()
+    train_s = time.perf_counter() - build_start
+
+    # Queries are new members of the same clusters, like a new photo of a known case.
+    probes = centers[rng.integers(len(centers), size=queries)] + rng.normal(size=(queries, dim))
+    report = {"rows": rows, "dim": dim, "k": k, "lists": num_lists, "nprobe": nprobe, "train_s": train_s}
+    found = {}
+    for mode in ("exact", "ivf"):
+        timings = []
+        found[mode] = []
+        for query in probes:
+            start = time.perf_counter()
+            neighbors = index.search(query, k=k, exact=mode == "exact")
+            timings.append((time.perf_counter() - start) * 1000)
+            found[mode].append({n["row"] for n in neighbors})
+        p50, p90 = np.percentile(timings, [50, 90])
+        report[mode] = {"p50_ms": float(p50), "p90_ms": float(p90)}
+    report["recall"] = float(np.mean([len(a & e) / len(e) for a, e in zip(found["ivf"], found["exact"])]))
+    return report
+
+# --- COMMAND LINE ---
+def build(index, log_db, batch_size=32):
+    """
+    Embeds every confirmed case in the prediction log that isn't indexed yet.
+    """
+    import feedback_log
+    import inference
+    import preprocessing
+
+    backend = inference.load_backend(EMBEDDING_BACKEND, use_model_server=False)
+    digest = model_fingerprint(inference.MODEL_PATH).digest
+    preprocessor = preprocessing.Preprocessor()
+    pending = [case for case in feedback_log.confirmed_predictions(log_db) if case[0] not in index]
+    added = 0
+    for start in range(0, len(pending), batch_size):
+        cases, images = [], []
+        for case in pending[start:start + batch_size]:
+            try:
+                images.append(inference.load_image(case[2]))
+                cases.append(case)
+            except (OSError, TypeError) as e:
+                print(f"Skipping {case[0]}: {e}")
+        if not cases:
+            continue
+        _, embeddings = backend.predict_with_embeddings(preprocessor.batch(images))
+        added += index.add(
+            embeddings,
+            labels=[case[1] for case in cases],
+            case_ids=[case[0] for case in cases],
+            image_paths=[case[2] for case in cases],
+            image_shas=[case[3] for case in cases],
+            model_digest=digest
+        )
+        print(f"Indexed {added} of {len(pending)} new confirmed cases")
+    return added
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query the similar-case embedding index.")
+    parser.add_argument("--index", default=os.environ.get("PLANT_EMBEDDING_INDEX") or DEFAULT_INDEX_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_parser = sub.add_parser("build", help="Index confirmed cases from the prediction log.")
+    build_parser.add_argument("--db", default=os.path.join(os.environ.get("PLANT_LOG_DIR") or "data", "predictions.db"))
+    build_parser.add_argument("--rebuild", action="store_true", help="Discard the existing index first.")
+    train_parser = sub.add_parser("train", help="Retrain the IVF lists over every indexed case.")
+    train_parser.add_argument("--lists", type=int, help="Number of lists (default: square root of the case count).")
+    search_parser = sub.add_parser("search", help="Show the nearest confirmed cases for an image.")
+    search_parser.add_argument("image")
+    search_parser.add_argument("-k", type=int, default=5)
+    search_parser.add_argument("--exact", action="store_true", help="Scan every case instead of the IVF lists.")
+    bench_parser = sub.add_parser("bench", help="Time exact and IVF search on a synthetic index.")
+    bench_parser.add_argument("--rows", type=int, default=100000)
+    bench_parser.add_argument("--dim", type=int, default=256)
+    bench_parser.add_argument("--queries", type=int, default=200)
+    bench_parser.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        if args.rebuild:
+            for name in ("vectors.f16", "ivf.npz", "cases.db", "cases.db-wal", "cases.db-shm"):
+                path = os.path.join(args.index, name)
+                if os.path.exists(path):
+                    os.remove(path)
+        index = EmbeddingIndex(args.index)
+        build(index, args.db)
+        if index.needs_training():
+            print(f"Trained {index.train_ivf()} IVF lists over {len(index)} cases")
+        return
+    if args.command == "train":
+        index = EmbeddingIndex(args.index)
+        print(f"Trained {index.train_ivf(args.lists)} IVF lists over {len(index)} cases")
+        return
+    if args.command == "bench":
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmp:
+            report = benchmark_search(tmp, args.rows, args.dim, args.queries, nprobe=args.nprobe)
+        print(f"{report['rows']} x {report['dim']} cases, {report['lists']} lists "
+              f"(trained in {report['train_s']:.1f} s), nprobe {report['nprobe']}")
+        for mode in ("exact", "ivf"):
+            print(f"{mode:>6}: p50 {report[mode]['p50_ms']:.2f} ms, p90 {report[mode]['p90_ms']:.2f} ms")
+        print(f"IVF recall@{report['k']} vs exact: {report['recall']:.3f}")
+        return
+
+    import inference
+
+    index = EmbeddingIndex(args.index)
+    backend = inference.load_backend(EMBEDDING_BACKEND, use_model_server=False)
+    _, embedding = inference.predict_with_embedding(backend, inference.load_image(args.image))
+    if embedding is None:
+        raise SystemExit("The Keras model does not expose an embedding layer.")
+    start = time.perf_counter()
+    neighbors = index.search(embedding, k=args.k, exact=args.exact)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    for neighbor in neighbors:
+        print(f"{neighbor['score']:.3f}  {neighbor['label']:<45} {neighbor['image_path']}")
+    print(f"Searched {len(index)} cases in {elapsed_ms:.1f} ms")
+
+if __name__ == "__main__":
+    main()
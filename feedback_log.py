@@ -0,0 +1,313 @@
+"""
+Prediction and feedback log for retraining.
+
+Every diagnosis is recorded with the image hash, predicted label, full
+probability vector and model digest; the "Yes"/"No" buttons in the app attach
+the user's feedback to it. Uploaded images are stored once per content hash
+under `image_dir/<first two hex chars>/<sha256><ext>`.
+
+Nothing here blocks the request path: `log_prediction()` and
+`record_feedback()` only put a record on a bounded in-memory queue (dropping
+it, and counting the drop, if the writer has fallen far behind). The queue is
+bounded both in records and in the bytes of the images it holds, so a slow
+disk can't pile up gigabytes of uploads in memory. A background
+thread writes image files and commits records to SQLite in WAL mode, in
+batches of up to `batch_size` or every `flush_interval` seconds.
+
+Export the log for retraining with:
+
+    python feedback_log.py export training.jsonl --with-feedback
+"""
+import argparse
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+DEFAULT_DB_PATH = os.path.join("data", "predictions.db")
+DEFAULT_IMAGE_DIR = os.path.join("data", "images")
+DEFAULT_MAX_PENDING_BYTES = 256 * 1024 * 1024
+IMAGE_EXTENSIONS = {b"\xff\xd8\xff": ".jpg", b"\x89PNG": ".png"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    image_sha256 TEXT NOT NULL,
+    image_path TEXT,
+    label TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    probabilities TEXT NOT NULL,
+    model_digest TEXT,
+    source TEXT,
+    route TEXT
+);
+CREATE TABLE IF NOT EXISTS feedback (
+    prediction_id TEXT NOT NULL,
+    created REAL NOT NULL,
+    helpful INTEGER NOT NULL,
+    correct_label TEXT
+);
+CREATE INDEX IF NOT EXISTS feedback_prediction ON feedback (prediction_id);
+"""
+
+# Columns added after the first release, applied to existing databases on open.
+MIGRATIONS = [
+    "ALTER TABLE predictions ADD COLUMN route TEXT",
+]
+
+def image_extension(data):
+    for magic, ext in IMAGE_EXTENSIONS.items():
+        if data.startswith(magic):
+            return ext
+    return ".bin"
+
+class PredictionLog:
+    """
+    Asynchronous, batched writer for predictions, feedback and images.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, image_dir=DEFAULT_IMAGE_DIR, batch_size=64,
+                 flush_interval=1.0, max_pending=10_000, max_pending_bytes=DEFAULT_MAX_PENDING_BYTES):
+        self.db_path = db_path
+        self.image_dir = image_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending_bytes = max_pending_bytes
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._pending_bytes = 0
+        self._bytes_lock = threading.Lock()
+        self._closed = False
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        os.makedirs(image_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="prediction-log", daemon=True)
+        self._thread.start()
+
+    # --- request path ---
+    def _enqueue(self, item, size=0):
+        with self._bytes_lock:
+            if size and self._pending_bytes + size > self.max_pending_bytes:
+                self.dropped += 1
+                return
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                self.dropped += 1
+                return
+            self._pending_bytes += size
+
+    def _release(self, size):
+        with self._bytes_lock:
+            self._pending_bytes -= size
+
+    @property
+    def pending_bytes(self):
+        return self._pending_bytes
+
+    def log_prediction(self, image_bytes, label, confidence, probabilities, model_digest=None, source="app",
+                       route=None):
+        """
+        Queues a prediction record and returns its id for attaching feedback later.
+        `route` is the cascade decision (see cascade.py), if any.
+        """
+        prediction_id = uuid.uuid4().hex
+        self._enqueue(("prediction", {
+            "id": prediction_id,
+            "created": time.time(),
+            "image_sha256": hashlib.sha256(image_bytes).hexdigest(),
+            "image_bytes": image_bytes,
+            "label": label,
+            "confidence": float(confidence),
+            "probabilities": [float(p) for p in probabilities],
+            "model_digest": model_digest,
+            "source": source,
+            "route": route,
+        }), size=len(image_bytes))
+        return prediction_id
+
+    def record_feedback(self, prediction_id, helpful, correct_label=None):
+        """
+        Queues the user's verdict on an earlier prediction.
+        """
+        self._enqueue(("feedback", {
+            "prediction_id": prediction_id,
+            "created": time.time(),
+            "helpful": bool(helpful),
+            "correct_label": correct_label,
+        }))
+
+    def flush(self, timeout=None):
+        """
+        Blocks until everything queued so far has been committed.
+        """
+        done = threading.Event()
+        self._queue.put(("barrier", done))
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        if not self._closed:
+            self._closed = True
+            self._queue.put(("stop", None))
+            self._thread.join(timeout)
+
+    def image_path(self, sha, data):
+        """
+        Returns where the image with content hash `sha` is (or will be) stored.
+        """
+        return os.path.join(self.image_dir, sha[:2], sha + image_extension(data))
+
+    # --- writer thread ---
+    def _store_image(self, sha, data):
+        """
+        Writes the image once per content hash and returns its path.
+        """
+        path = self.image_path(sha, data)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return path
+
+    def _commit(self, db, batch):
+        predictions, feedback = [], []
+        for kind, record in batch:
+            if kind == "prediction":
+                image_path = self._store_image(record["image_sha256"], record.pop("image_bytes"))
+                predictions.append((
+                    record["id"], record["created"], record["image_sha256"], image_path, record["label"],
+                    record["confidence"], json.dumps(record["probabilities"]), record["model_digest"],
+                    record["source"], json.dumps(record["route"]) if record["route"] else None,
+                ))
+            else:
+                feedback.append((
+                    record["prediction_id"], record["created"], int(record["helpful"]), record["correct_label"],
+                ))
+        with db:
+            db.executemany("INSERT OR IGNORE INTO predictions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", predictions)
+            db.executemany("INSERT INTO feedback VALUES (?, ?, ?, ?)", feedback)
+
+    def _run(self):
+        db = sqlite3.connect(self.db_path)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(SCHEMA)
+        for migration in MIGRATIONS:
+            try:
+                db.execute(migration)
+            except sqlite3.OperationalError:
+                pass  # already applied
+        batch, waiters, stop = [], [], False
+        while not stop:
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    kind, record = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if kind == "barrier":
+                    waiters.append(record)
+                    break
+                if kind == "stop":
+                    stop = True
+                    break
+                batch.append((kind, record))
+            if batch:
+                sizes = sum(len(r["image_bytes"]) for kind, r in batch if kind == "prediction")
+                try:
+                    self._commit(db, batch)
+                except (sqlite3.Error, OSError) as e:
+                    self.dropped += len(batch)
+                    print(f"Prediction log write failed, dropped {len(batch)} records: {e}")
+                finally:
+                    self._release(sizes)
+                batch = []
+            for waiter in waiters:
+                waiter.set()
+            waiters = []
+        db.close()
+
+def create_log():
+    """
+    Builds the prediction log under PLANT_LOG_DIR (default "data"), or
+    returns None if PLANT_LOG_DIR is set to an empty string.
+    """
+    log_dir = os.environ.get("PLANT_LOG_DIR", "data")
+    if not log_dir:
+        return None
+    return PredictionLog(
+        db_path=os.path.join(log_dir, "predictions.db"),
+        image_dir=os.path.join(log_dir, "images")
+    )
+
+# --- EXPORT ---
+# Each prediction with its latest feedback, if any.
+LATEST_FEEDBACK_QUERY = """
+    SELECT p.*, f.helpful, f.correct_label
+    FROM predictions p
+    LEFT JOIN feedback f ON f.rowid = (
+        SELECT rowid FROM feedback WHERE prediction_id = p.id ORDER BY created DESC LIMIT 1
+    )
+"""
+
+def export(db_path, output, with_feedback=False):
+    """
+    Writes one JSON object per prediction (with its latest feedback, if any) to `output`.
+    Returns the number of rows written.
+    """
+    db = sqlite3.connect(db_path)
+    db.row_factory = sqlite3.Row
+    query = LATEST_FEEDBACK_QUERY
+    if with_feedback:
+        query += " WHERE f.helpful IS NOT NULL"
+    count = 0
+    with open(output, "w") as out:
+        for row in db.execute(query + " ORDER BY p.created"):
+            record = dict(row)
+            record["probabilities"] = json.loads(record["probabilities"])
+            if record.get("route"):
+                record["route"] = json.loads(record["route"])
+            if record["helpful"] is not None:
+                record["helpful"] = bool(record["helpful"])
+            out.write(json.dumps(record) + "\n")
+            count += 1
+    db.close()
+    return count
+
+def confirmed_predictions(db_path):
+    """
+    Yields (prediction_id, confirmed label, image_path, image_sha256) for
+    predictions whose latest feedback confirms a diagnosis: "helpful"
+    confirms the predicted label, a correction confirms the corrected one.
+    """
+    db = sqlite3.connect(db_path)
+    try:
+        query = f"""
+            SELECT id, CASE WHEN helpful THEN label ELSE correct_label END, image_path, image_sha256
+            FROM ({LATEST_FEEDBACK_QUERY})
+            WHERE helpful = 1 OR correct_label IS NOT NULL
+            ORDER BY created
+        """
+        yield from db.execute(query)
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Work with the prediction/feedback log.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    exp = sub.add_parser("export", help="Export predictions as JSONL for retraining.")
+    exp.add_argument("output")
+    exp.add_argument("--db", default=os.path.join(os.environ.get("PLANT_LOG_DIR") or "data", "predictions.db"))
+    exp.add_argument("--with-feedback", action="store_true", help="Only rows that received feedback.")
+    args = parser.parse_args()
+    if args.command == "export":
+        print(f"Exported {export(args.db, args.output, args.with_feedback)} predictions to {args.output}")
+
+if __name__ == "__main__":
+    main()
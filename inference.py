@@ -0,0 +1,264 @@
+"""
+Core inference helpers shared by the Streamlit app and the command-line tools.
+
+Nothing in this module touches Streamlit, so it can be imported from scripts
+and worker processes without rendering any UI. TensorFlow and gdown are only
+imported once a model is actually downloaded or loaded.
+"""
+import json
+import os
+
+import numpy as np
+
+import backends
+import metrics
+import preprocessing
+from cache import file_digest
+
+# --- 1. CONFIGURATION ---
+MODEL_ID = "1ozwUc7E-CO88WAQaiKXc8eG6G533sVpB"
+MODEL_PATH = backends.DEFAULT_MODEL_PATH
+# Pinned SHA-256 of the published model file. When set, an existing file that
+# doesn't match is re-downloaded and a download that doesn't match is rejected.
+MODEL_SHA256 = os.environ.get("PLANT_MODEL_SHA256") or None
+LABELS_PATH = "class_indices.json"
+IMG_SIZE = backends.INPUT_SHAPE[:2]
+
+# Reuses one float32 input buffer per thread across predict() calls.
+_preprocessor = preprocessing.Preprocessor(IMG_SIZE)
+
+# --- 2. MODEL AND LABELS LOADING ---
+def verify_model(model_path=MODEL_PATH, expected_sha256=MODEL_SHA256):
+    """
+    Returns True if the model file exists and matches the pinned checksum
+    (any existing file is accepted when no checksum is pinned).
+    """
+    if not os.path.exists(model_path):
+        return False
+    return expected_sha256 is None or file_digest(model_path) == expected_sha256.lower()
+
+def download_model(model_path=MODEL_PATH, expected_sha256=MODEL_SHA256, quiet=False, force=False):
+    """
+    Downloads the model from Google Drive unless a verified copy already exists.
+    The download goes to a temporary file that only replaces `model_path`
+    once it has passed verification, so an interrupted download is never
+    mistaken for a valid model.
+
+    Only MODEL_PATH is the published model: any other path is the caller's
+    own model, which is never checked against the pinned checksum or
+    replaced, and raises FileNotFoundError if it doesn't exist.
+    """
+    if os.path.abspath(model_path) != os.path.abspath(MODEL_PATH):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Model file not found: {model_path}")
+        return model_path
+    if not force and verify_model(model_path, expected_sha256):
+        return model_path
+    import gdown
+
+    tmp_path = model_path + ".part"
+    gdown.download(f"https://drive.google.com/uc?id={MODEL_ID}", tmp_path, quiet=quiet)
+    if not os.path.exists(tmp_path):
+        raise RuntimeError(f"Could not download the model from Google Drive (id {MODEL_ID})")
+    if not verify_model(tmp_path, expected_sha256):
+        os.remove(tmp_path)
+        raise ValueError(f"Downloaded model does not match the pinned SHA-256 {expected_sha256}")
+    os.replace(tmp_path, model_path)
+    return model_path
+
+def load_keras_model(model_path=MODEL_PATH, download=True):
+    """
+    Downloads the published model if needed (see download_model), then
+    loads and returns the Keras model.
+    """
+    from tensorflow.keras.models import load_model
+
+    if download:
+        download_model(model_path)
+    return load_model(model_path)
+
+def load_backend(config=None, model_path=MODEL_PATH, use_model_server=True):
+    """
+    Loads the model and wraps it in the configured inference backend
+    (see backends.py), warmed up and ready for `predict()`. If a shared model
+    server is configured and reachable, a client for it is returned instead.
+    """
+    if use_model_server:
+        import model_server
+
+        client = model_server.connect_if_configured()
+        if client is not None:
+            return client
+    config = {**backends.default_config(), **(config or {})}
+    model = None
+    if config["backend"] == "keras":
+        backends.configure_threads(config["intra_op_threads"], config["inter_op_threads"])
+        model = load_keras_model(model_path)
+    return backends.create_backend(model, config)
+
+def served_model_paths(config=None, model_path=MODEL_PATH):
+    """
+    Returns the model files whose weights produce the predictions of the
+    backend `load_backend(config)` would build in this process: the TFLite
+    artifact or the Keras model, plus the cascade's cheap model if any.
+    """
+    config = {**backends.default_config(), **(config or {})}
+    paths = [config["tflite_path"] if config["backend"] == "tflite" else model_path]
+    if config["cascade_model"]:
+        paths.append(config["cascade_model"])
+    return paths
+
+def load_labels(labels_path=LABELS_PATH):
+    """
+    Loads the class indices JSON file and returns an index -> label mapping.
+    """
+    with open(labels_path, "r") as f:
+        class_indices = json.load(f)
+    return {v: k for k, v in class_indices.items()}
+
+# --- 3. PREPROCESSING ---
+def load_image(source, min_size=None):
+    """
+    Opens an image from a path or file-like object and converts it to RGB,
+    decoding JPEGs at reduced resolution (see preprocessing.open_image).
+    """
+    with metrics.timed("decode"):
+        return preprocessing.open_image(source, min_size=min_size)
+
+def preprocess(img):
+    """
+    Resizes and scales a PIL image into a new (128, 128, 3) float32 array.
+    """
+    with metrics.timed("preprocess"):
+        return preprocessing.to_array(preprocessing.resize(img, IMG_SIZE))
+
+def load_and_preprocess(path):
+    """
+    Decodes and preprocesses a single image file.
+    Returns (path, array, error) so it can be used as a worker-pool task;
+    `array` is None and `error` holds the message if decoding failed.
+    """
+    try:
+        return path, preprocess(load_image(path)), None
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}"
+
+# --- 4. PREDICTION ---
+def decode_predictions(labels, predictions):
+    """
+    Converts a (N, num_classes) probability array into (label, confidence)
+    tuples and records them in the prediction metrics.
+    """
+    with metrics.timed("label_lookup"):
+        class_indices = np.argmax(predictions, axis=1)
+        confidences = np.max(predictions, axis=1)
+        results = [(labels[int(i)], float(c)) for i, c in zip(class_indices, confidences)]
+    for label, confidence in results:
+        metrics.record_prediction(label, confidence)
+    return results
+
+def format_label(label):
+    """
+    Cleans a raw class label for a human-readable display.
+    """
+    return label.replace('___', ' ').replace('_', ' ').title()
+
+def predict_proba(backend, img):
+    """
+    Takes a PIL image and returns the full probability vector.
+    """
+    with metrics.timed("preprocess"):
+        batch = _preprocessor.batch([img])
+    with metrics.timed("model"):
+        return np.asarray(backend.predict(batch))[0]
+
+def predict_with_embedding(backend, img):
+    """
+    Takes a PIL image and returns (probabilities, embedding), where the
+    embedding is the model's penultimate-layer output, or None if the backend
+    doesn't expose it.
+    """
+    with metrics.timed("preprocess"):
+        batch = _preprocessor.batch([img])
+    with metrics.timed("model"):
+        try:
+            probabilities, embeddings = backend.predict_with_embeddings(batch)
+        except NotImplementedError:
+            return np.asarray(backend.predict(batch))[0], None
+    return np.asarray(probabilities)[0], np.asarray(embeddings)[0]
+
+def predict_with_embedding_routed(backend, img):
+    """
+    Like `predict_with_embedding`, but also returns the route (None if the
+    backend is not a cascade). A cascade answers from the full-model pass
+    that produces the embedding, with route "embedding"; if it can't produce
+    one, the image is routed as usual and the embedding is None.
+    """
+    routed = getattr(backend, "predict_with_embeddings_routed", None)
+    if routed is None:
+        return (*predict_with_embedding(backend, img), None)
+    with metrics.timed("preprocess"):
+        batch = _preprocessor.batch([img])
+    with metrics.timed("model"):
+        try:
+            probabilities, embeddings, routes = routed(batch)
+        except NotImplementedError:
+            probabilities, routes = backend.predict_routed(batch)
+            return np.asarray(probabilities)[0], None, routes[0]
+    return np.asarray(probabilities)[0], np.asarray(embeddings)[0], routes[0]
+
+def embed(backend, img):
+    """
+    Takes a PIL image and returns the model's penultimate-layer embedding, or
+    None if the backend doesn't expose it. Behind a cascade this always runs
+    the full model.
+    """
+    return predict_with_embedding(backend, img)[1]
+
+def predict(backend, labels, img):
+    """
+    Takes a PIL image and returns the prediction label and confidence.
+    """
+    return decode_predictions(labels, predict_proba(backend, img)[None])[0]
+
+def predict_batch_proba(backend, images, batch_size=16):
+    """
+    Runs a list of PIL images through the backend `batch_size` images at a
+    time and returns the (N, num_classes) probability array.
+    """
+    predictions = []
+    for start in range(0, len(images), batch_size):
+        with metrics.timed("preprocess"):
+            batch = _preprocessor.batch(images[start:start + batch_size])
+        with metrics.timed("model"):
+            predictions.append(backend.predict(batch))
+    return np.concatenate(predictions)
+
+def predict_batch_routed(backend, images, batch_size=16):
+    """
+    Like `predict_batch_proba`, but also returns one route per image recording
+    which model of a cascade answered it (see cascade.py); the routes are
+    None if the backend is not a cascade.
+    """
+    predict_routed = getattr(backend, "predict_routed", None)
+    if predict_routed is None:
+        return predict_batch_proba(backend, images, batch_size), [None] * len(images)
+    predictions, routes = [], []
+    for start in range(0, len(images), batch_size):
+        with metrics.timed("preprocess"):
+            batch = _preprocessor.batch(images[start:start + batch_size])
+        with metrics.timed("model"):
+            probabilities, batch_routes = predict_routed(batch)
+        predictions.append(probabilities)
+        routes.extend(batch_routes)
+    return np.concatenate(predictions), routes
+
+def predict_batch(backend, labels, images, batch_size=16):
+    """
+    Takes a list of PIL images and runs them through the backend
+    `batch_size` images at a time.
+    Returns a list of (label, confidence) tuples in input order.
+    """
+    if not images:
+        return []
+    return decode_predictions(labels, predict_batch_proba(backend, images, batch_size))
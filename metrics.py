@@ -0,0 +1,175 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition.
+
+Each stage of the request path is wrapped in `timed(stage)`, which records
+into a latency histogram; predictions are counted per class and their
+confidence goes into a histogram so drift shows up over time. Recording is
+a lock, a bisect and a few additions, so it's cheap enough to leave on.
+
+Metrics are exposed as Prometheus text by `render()`: the HTTP service
+serves it at /metrics, and the Streamlit app writes it to PLANT_METRICS_FILE
+(for node_exporter's textfile collector) when that is set.
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONFIDENCE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99, 1.0)
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+class Counter:
+    """
+    A monotonically increasing count, optionally split by labels.
+    """
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name + _format_labels(self.labelnames, key), value
+
+class Histogram:
+    """
+    Counts observations into fixed buckets, optionally split by labels.
+    """
+    type = "histogram"
+
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        # key -> [per-bucket counts (+Inf last), sum, count, last value]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0, 0.0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+            series[3] = value
+
+    def summary(self):
+        """
+        Returns {label values: (count, sum, last value)} for each series.
+        """
+        with self._lock:
+            return {key: (s[2], s[1], s[3]) for key, s in self._series.items()}
+
+    def samples(self):
+        with self._lock:
+            series = {key: (list(s[0]), s[1], s[2]) for key, s in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield self.name + "_bucket" + _format_labels(self.labelnames, key, [("le", le)]), cumulative
+            yield self.name + "_sum" + _format_labels(self.labelnames, key), total
+            yield self.name + "_count" + _format_labels(self.labelnames, key), count
+
+class Registry:
+    """
+    Collection of metrics rendered together.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, value in metric.samples():
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "plant_stage_duration_seconds",
+    "Time spent in each stage of the request path.",
+    LATENCY_BUCKETS,
+    ("stage",)
+))
+PREDICTIONS = REGISTRY.register(Counter(
+    "plant_predictions_total",
+    "Predictions served, by predicted class.",
+    ("label",)
+))
+CONFIDENCE = REGISTRY.register(Histogram(
+    "plant_prediction_confidence",
+    "Top-1 confidence of served predictions.",
+    CONFIDENCE_BUCKETS
+))
+
+@contextmanager
+def timed(stage):
+    """
+    Records the duration of the enclosed block under `stage`.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+def record_prediction(label, confidence):
+    PREDICTIONS.inc(label=label)
+    CONFIDENCE.observe(confidence)
+
+def stage_summary():
+    """
+    Returns {stage: {"count", "mean_ms", "last_ms"}} for the debug panel.
+    """
+    return {
+        key[0]: {"count": count, "mean_ms": total / count * 1000, "last_ms": last * 1000}
+        for key, (count, total, last) in sorted(STAGE_SECONDS.summary().items())
+    }
+
+def render():
+    """
+    Returns all metrics in the Prometheus text exposition format.
+    """
+    return REGISTRY.render()
+
+def write_textfile(path):
+    """
+    Atomically writes the metrics to `path` for a textfile collector.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(render())
+    os.replace(tmp_path, path)
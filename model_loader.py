@@ -0,0 +1,133 @@
+"""
+Background model loading with a pollable readiness state.
+
+`ModelLoader.start()` returns immediately; a daemon thread then connects to
+the shared model server if one is configured (see model_server.py), or
+otherwise imports TensorFlow, verifies (and if needed downloads) the model,
+deserializes it into the configured backend and warms it up. The UI can render in the
+meantime and check `state`, or block on `wait()` when it actually needs a
+prediction.
+
+Each stage is timed; set PLANT_STARTUP_REPORT=1 to print the breakdown once
+the model is ready.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import backends
+import inference
+import model_server
+
+PENDING = "pending"
+CONNECTING = "connecting"
+IMPORTING = "importing"
+VERIFYING = "verifying"
+DOWNLOADING = "downloading"
+DESERIALIZING = "deserializing"
+WARMING_UP = "warming up"
+READY = "ready"
+FAILED = "failed"
+
+class ModelLoader:
+    """
+    Loads the inference backend on a background thread.
+    """
+
+    def __init__(self, model_path=inference.MODEL_PATH, expected_sha256=inference.MODEL_SHA256, config=None):
+        self.model_path = model_path
+        self.expected_sha256 = expected_sha256
+        self.config = {**backends.default_config(), **(config or {}), "warmup": False}
+        self.state = PENDING
+        self.backend = None
+        self.error = None
+        self.timings = {}
+        self._ready = threading.Event()
+        self._thread = None
+        self._started_at = None
+
+    def start(self):
+        """
+        Starts loading in the background (idempotent) and returns self.
+        """
+        if self._thread is None:
+            self._started_at = time.perf_counter()
+            self._thread = threading.Thread(target=self._run, name="model-loader", daemon=True)
+            self._thread.start()
+        return self
+
+    @property
+    def ready(self):
+        return self.state == READY
+
+    def wait(self, timeout=None):
+        """
+        Blocks until loading finishes. Returns the backend, or raises the
+        loading error if it failed.
+        """
+        self._ready.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.backend
+
+    @contextmanager
+    def _stage(self, name, state):
+        self.state = state
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = time.perf_counter() - start
+
+    def _run(self):
+        try:
+            with self._stage("connect", CONNECTING):
+                client = model_server.connect_if_configured()
+            if client is not None:
+                self._finish(client)
+                return
+
+            with self._stage("imports", IMPORTING):
+                import tensorflow  # noqa: F401
+
+            model = None
+            if self.config["backend"] == "keras":
+                with self._stage("verify", VERIFYING):
+                    valid = inference.verify_model(self.model_path, self.expected_sha256)
+                if not valid:
+                    with self._stage("download", DOWNLOADING):
+                        inference.download_model(self.model_path, self.expected_sha256, force=True)
+                with self._stage("deserialize", DESERIALIZING):
+                    backends.configure_threads(self.config["intra_op_threads"], self.config["inter_op_threads"])
+                    model = inference.load_keras_model(self.model_path, download=False)
+                    backend = backends.create_backend(model, self.config)
+            else:
+                with self._stage("deserialize", DESERIALIZING):
+                    backend = backends.create_backend(model, self.config)
+
+            with self._stage("warmup", WARMING_UP):
+                backend.warmup()
+
+            self._finish(backend)
+        except Exception as e:
+            self.error = e
+            self.state = FAILED
+        finally:
+            self._ready.set()
+
+    def _finish(self, backend):
+        self.backend = backend
+        self.timings["total"] = time.perf_counter() - self._started_at
+        self.state = READY
+        if os.environ.get("PLANT_STARTUP_REPORT"):
+            print(self.report())
+
+    def report(self):
+        """
+        Returns a human-readable breakdown of time spent in each startup stage.
+        """
+        lines = ["Startup report:"]
+        for name, seconds in self.timings.items():
+            lines.append(f"  {name:<12} {seconds:8.2f} s")
+        return "\n".join(lines)
@@ -0,0 +1,267 @@
+"""
+Shared local model server, so several app workers on a host don't each load
+TensorFlow and their own copy of the weights.
+
+One server process owns the model:
+
+    python model_server.py --address /tmp/plant-model.sock
+
+and every worker started with PLANT_MODEL_SERVER=/tmp/plant-model.sock uses
+a `ModelServerClient` as its inference backend instead of loading the model.
+If the server can't be reached at startup, workers fall back to in-process
+inference.
+
+Pixel data never goes through pickling. On connect, each client allocates a
+shared-memory segment holding an input region for `max_batch` preprocessed
+128x128x3 float32 images and an output region for their probabilities, and
+sends the segment's name. After that a request is just the tuple
+("predict", n) on the connection: the server runs the first `n` input slots
+through the model, writes the probabilities into the output region and
+replies ("ok",).
+
+    PLANT_MODEL_SERVER           socket path, or host:port for TCP on a loopback address
+    PLANT_MODEL_SERVER_AUTHKEY   shared secret for the connection handshake
+
+The connection unpickles what it receives, so it must only ever be reachable
+by trusted local processes: the Unix socket is created owner-only, TCP
+addresses must be loopback, and TCP requires PLANT_MODEL_SERVER_AUTHKEY to be
+set (the built-in key is only accepted for Unix sockets).
+"""
+import argparse
+import ipaddress
+import os
+import threading
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+import backends
+
+DEFAULT_AUTHKEY = "plant-model"
+DEFAULT_MAX_BATCH = 64
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def parse_address(address):
+    """
+    Returns (address, family) for a socket path or a host:port string.
+    Raises ValueError for TCP addresses that aren't on a loopback interface.
+    """
+    if ":" in address and not address.startswith("/"):
+        host, port = address.rsplit(":", 1)
+        host = host.strip("[]")
+        if not is_loopback(host):
+            raise ValueError(
+                f"Model server address {address} is not a loopback address; use 127.0.0.1 or a socket path."
+            )
+        return (host, int(port)), "AF_INET"
+    return address, "AF_UNIX"
+
+def authkey(family):
+    """
+    Returns the handshake key. TCP needs an explicitly configured secret.
+    """
+    key = os.environ.get("PLANT_MODEL_SERVER_AUTHKEY")
+    if not key:
+        if family != "AF_UNIX":
+            raise ValueError("PLANT_MODEL_SERVER_AUTHKEY must be set to use the model server over TCP.")
+        key = DEFAULT_AUTHKEY
+    return key.encode("utf-8")
+
+def _regions(buf, max_batch, num_classes):
+    """
+    Maps the input and output arrays onto a shared-memory buffer.
+    """
+    inputs = np.ndarray((max_batch,) + backends.INPUT_SHAPE, dtype=np.float32, buffer=buf)
+    outputs = np.ndarray((max_batch, num_classes), dtype=np.float32, buffer=buf, offset=inputs.nbytes)
+    return inputs, outputs
+
+def _segment_size(max_batch, num_classes):
+    return max_batch * (int(np.prod(backends.INPUT_SHAPE)) + num_classes) * 4
+
+def _attach(name):
+    """
+    Attaches to a client's segment without letting this process's resource
+    tracker unlink it on exit; the client owns its lifetime.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 always registers attached segments with the tracker.
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+# --- 1. SERVER ---
+class ModelServer:
+    """
+    Serves one backend to many local clients, one thread per connection.
+    """
+
+    def __init__(self, backend, num_classes, address):
+        self.backend = backend
+        self.num_classes = num_classes
+        self.address, self.family = parse_address(address)
+
+    def serve_forever(self):
+        key = authkey(self.family)
+        if self.family == "AF_UNIX" and os.path.exists(self.address):
+            os.remove(self.address)
+        # Owner-only socket file, so other local users can't even connect.
+        old_umask = os.umask(0o177)
+        try:
+            listener = Listener(self.address, family=self.family, authkey=key)
+        finally:
+            os.umask(old_umask)
+        with listener:
+            print(f"Model server listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    # A client that fails the handshake must not take the server down.
+                    print(f"Rejected connection: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        shm = None
+        try:
+            conn.send(("hello", self.num_classes, backends.INPUT_SHAPE))
+            kind, name, max_batch = conn.recv()
+            if kind != "attach":
+                return
+            shm = _attach(name)
+            inputs, outputs = _regions(shm.buf, max_batch, self.num_classes)
+            conn.send(("ok",))
+            while True:
+                kind, n = conn.recv()
+                if kind != "predict":
+                    break
+                try:
+                    outputs[:n] = self.backend.predict(inputs[:n])
+                    conn.send(("ok",))
+                except Exception as e:
+                    conn.send(("error", f"{type(e).__name__}: {e}"))
+        except (EOFError, ConnectionError):
+            pass
+        finally:
+            conn.close()
+            if shm is not None:
+                # Drop our array views before closing the mapping.
+                inputs = outputs = None
+                shm.close()
+
+# --- 2. CLIENT ---
+class ModelServerClient(backends.InferenceBackend):
+    """
+    Inference backend that forwards batches to a `ModelServer` through shared memory.
+    """
+    name = "model-server"
+
+    def __init__(self, address, max_batch=DEFAULT_MAX_BATCH):
+        self.address = address
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._conn = None
+        self._shm = None
+        self._connect()
+
+    def _connect(self):
+        address, family = parse_address(self.address)
+        conn = Client(address, family=family, authkey=authkey(family))
+        _, num_classes, input_shape = conn.recv()
+        if tuple(input_shape) != backends.INPUT_SHAPE:
+            conn.close()
+            raise ValueError(f"Model server expects inputs of shape {input_shape}")
+        shm = shared_memory.SharedMemory(create=True, size=_segment_size(self.max_batch, num_classes))
+        conn.send(("attach", shm.name, self.max_batch))
+        conn.recv()
+        self.num_classes = num_classes
+        self._conn, self._shm = conn, shm
+        self._inputs, self._outputs = _regions(shm.buf, self.max_batch, num_classes)
+
+    def _predict_chunk(self, chunk):
+        n = len(chunk)
+        self._inputs[:n] = chunk
+        self._conn.send(("predict", n))
+        reply = self._conn.recv()
+        if reply[0] != "ok":
+            raise RuntimeError(f"Model server error: {reply[1]}")
+        return self._outputs[:n].copy()
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            if self._conn is None:
+                self._connect()
+            try:
+                return np.concatenate([
+                    self._predict_chunk(batch[start:start + self.max_batch])
+                    for start in range(0, len(batch), self.max_batch)
+                ])
+            except (EOFError, ConnectionError, OSError):
+                # The server restarted; reconnect on the next call.
+                self._release()
+                raise
+
+    def _release(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        if self._shm is not None:
+            self._inputs = self._outputs = None
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def close(self):
+        with self._lock:
+            self._release()
+
+    def __del__(self):
+        try:
+            self._release()
+        except Exception:
+            pass
+
+def connect_if_configured():
+    """
+    Returns a client for PLANT_MODEL_SERVER, or None if it isn't set or the
+    server can't be reached (callers then fall back to in-process inference).
+    """
+    address = os.environ.get("PLANT_MODEL_SERVER")
+    if not address:
+        return None
+    try:
+        return ModelServerClient(address)
+    except (OSError, EOFError, ValueError) as e:
+        print(f"Model server at {address} unavailable, using in-process inference: {e}")
+        return None
+
+# --- 3. COMMAND LINE ---
+def main():
+    import inference
+
+    parser = argparse.ArgumentParser(description="Serve the model to local app workers over shared memory.")
+    parser.add_argument("--address", default=os.environ.get("PLANT_MODEL_SERVER", "/tmp/plant-model.sock"),
+                        help="Unix socket path, or host:port.")
+    args = parser.parse_args()
+
+    try:
+        server = ModelServer(None, len(inference.load_labels()), args.address)
+        authkey(server.family)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    server.backend = inference.load_backend(use_model_server=False)
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Offline model optimization: quantized TFLite artifacts, validated against the original.
+
+Takes the Keras model and a labeled image directory with one sub-directory
+per class in class_indices.json, and:
+
+1. exports a float16 and an int8 post-training-quantized TFLite model, the
+   int8 one calibrated on a representative sample of the images (or on
+   --calibration-data) that is held out of the evaluation;
+2. evaluates the original model and each artifact on the remaining images
+   for top-1 accuracy, per-class recall, p50 single-image latency and file size;
+3. writes a manifest that `PLANT_BACKEND=auto` uses to pick the fastest
+   artifact whose accuracy drop is within tolerance (see backends.py).
+
+Usage:
+    python optimize_model.py --data validation_images/ --output-dir models/
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+import backends
+import inference
+from cache import file_digest
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# --- 1. DATA ---
+def load_labeled_images(data_dir, labels, limit_per_class=None, seed=0):
+    """
+    Returns (arrays, class indices) for images under data_dir/<label>/.
+    Directories that don't match a known class are reported and skipped.
+    """
+    index_of = {label: i for i, label in labels.items()}
+    rng = random.Random(seed)
+    arrays, targets = [], []
+    for name in sorted(os.listdir(data_dir)):
+        class_dir = os.path.join(data_dir, name)
+        if not os.path.isdir(class_dir):
+            continue
+        if name not in index_of:
+            print(f"Skipping {class_dir}: not a class in {inference.LABELS_PATH}")
+            continue
+        files = sorted(f for f in os.listdir(class_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+        if limit_per_class and len(files) > limit_per_class:
+            files = rng.sample(files, limit_per_class)
+        for filename in files:
+            _, array, error = inference.load_and_preprocess(os.path.join(class_dir, filename))
+            if error is None:
+                arrays.append(array)
+                targets.append(index_of[name])
+    if not arrays:
+        raise SystemExit(f"No labeled images found under {data_dir}")
+    return np.stack(arrays), np.array(targets)
+
+def split_calibration(images, targets, samples, seed=0):
+    """
+    Holds out `samples` random images (at most half) for int8 calibration and
+    returns (calibration, evaluation images, evaluation targets), so the
+    artifacts are never scored on the images they were calibrated on.
+    """
+    samples = min(samples, len(images) // 2)
+    order = np.random.default_rng(seed).permutation(len(images))
+    held_out, rest = order[:samples], np.sort(order[samples:])
+    return images[held_out], images[rest], targets[rest]
+
+# --- 2. EXPORT ---
+def export_float16(model, path):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.target_spec.supported_types = [tf.float16]
+    with open(path, "wb") as f:
+        f.write(converter.convert())
+    return path
+
+def export_int8(model, path, calibration):
+    """
+    Full-integer quantization calibrated on `calibration` samples. Inputs and
+    outputs stay float32 so the artifact is a drop-in replacement.
+    """
+    import tensorflow as tf
+
+    def representative_dataset():
+        for sample in calibration:
+            yield [sample[None].astype(np.float32)]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    with open(path, "wb") as f:
+        f.write(converter.convert())
+    return path
+
+# --- 3. EVALUATION ---
+def evaluate(backend, images, targets, labels, batch_size=32, latency_runs=50):
+    """
+    Returns accuracy, per-class recall and p50 latency for one backend.
+    """
+    predictions = np.concatenate([
+        np.argmax(backend.predict(images[start:start + batch_size]), axis=1)
+        for start in range(0, len(images), batch_size)
+    ])
+    recall = {}
+    for index, label in labels.items():
+        mask = targets == index
+        if mask.any():
+            recall[label] = float((predictions[mask] == index).mean())
+    return {
+        "accuracy": float((predictions == targets).mean()),
+        "per_class_recall": recall,
+        "p50_ms": backends.measure_latency(backend.predict, runs=latency_runs)["p50_ms"],
+    }, predictions
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and validate quantized TFLite variants of the model.")
+    parser.add_argument("--model", default=inference.MODEL_PATH)
+    parser.add_argument("--data", required=True, help="Labeled image directory, one sub-directory per class.")
+    parser.add_argument("--output-dir", default=os.path.dirname(backends.DEFAULT_MANIFEST_PATH))
+    parser.add_argument("--limit-per-class", type=int, help="Evaluate on at most this many images per class.")
+    parser.add_argument("--calibration-samples", type=int, default=200,
+                        help="Images held out of --data for int8 calibration.")
+    parser.add_argument("--calibration-data",
+                        help="Separate labeled directory to calibrate on instead of holding out part of --data.")
+    parser.add_argument("--latency-runs", type=int, default=50)
+    parser.add_argument("--tolerance", type=float, default=backends.DEFAULT_ACCURACY_TOLERANCE,
+                        help="Largest accuracy drop for an artifact to be marked acceptable.")
+    args = parser.parse_args()
+
+    labels = inference.load_labels()
+    images, targets = load_labeled_images(args.data, labels, args.limit_per_class)
+    if args.calibration_data:
+        calibration, _ = load_labeled_images(args.calibration_data, labels)
+        calibration = calibration[np.random.default_rng(0).permutation(len(calibration))[:args.calibration_samples]]
+    else:
+        calibration, images, targets = split_calibration(images, targets, args.calibration_samples)
+    print(f"Loaded {len(images)} labeled images for evaluation and {len(calibration)} for calibration")
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    model = inference.load_keras_model(args.model)
+    # Artifacts are compared against the model alone, never through a cascade.
+    reference_backend = backends.create_backend(model, {"backend": "keras", "cascade_model": None})
+    reference, reference_predictions = evaluate(
+        reference_backend, images, targets, labels, latency_runs=args.latency_runs
+    )
+    reference["size_bytes"] = os.path.getsize(args.model)
+    print(f"original: accuracy {reference['accuracy']:.4f}, p50 {reference['p50_ms']:.2f} ms")
+
+    exports = {
+        "float16": lambda path: export_float16(model, path),
+        "int8": lambda path: export_int8(model, path, calibration),
+    }
+    artifacts = []
+    for name, export in exports.items():
+        filename = f"final_model_{name}.tflite"
+        path = export(os.path.join(args.output_dir, filename))
+        backend = backends.create_backend(config={"backend": "tflite", "tflite_path": path, "cascade_model": None})
+        stats, predictions = evaluate(backend, images, targets, labels, latency_runs=args.latency_runs)
+        stats.update({
+            "name": name,
+            "path": filename,
+            "size_bytes": os.path.getsize(path),
+            "accuracy_drop": reference["accuracy"] - stats["accuracy"],
+            "agreement": float((predictions == reference_predictions).mean()),
+        })
+        stats["acceptable"] = stats["accuracy_drop"] <= args.tolerance
+        artifacts.append(stats)
+        print(
+            f"{name}: accuracy {stats['accuracy']:.4f} (drop {stats['accuracy_drop']:+.4f}), "
+            f"p50 {stats['p50_ms']:.2f} ms, {stats['size_bytes'] / 1e6:.1f} MB"
+        )
+
+    manifest = {
+        "created": time.time(),
+        "source_model": os.path.abspath(args.model),
+        "source_sha256": file_digest(args.model),
+        "evaluation_images": int(len(images)),
+        "calibration_images": int(len(calibration)),
+        "tolerance": args.tolerance,
+        "reference": reference,
+        "artifacts": artifacts,
+    }
+    manifest_path = os.path.join(args.output_dir, "manifest.json")
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    choice = backends.select_artifact(manifest_path, args.tolerance, model_path=args.model)
+    print(f"Wrote {manifest_path}; PLANT_BACKEND=auto would use {choice['name'] if choice else 'the Keras model'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Fast image preprocessing for the 128x128 model input.
+
+Phone photos are 12-48 MP, but the model only ever sees 128x128 pixels, so
+this module avoids paying for the pixels it throws away:
+
+- JPEGs are decoded with Pillow's draft mode, which lets libjpeg scale the
+  image down by 1/2, 1/4 or 1/8 while decoding instead of producing every
+  full-resolution pixel first.
+- Resizing stays in uint8 and uses `reducing_gap`, so large non-JPEG inputs
+  are box-reduced before the final bicubic pass.
+- Scaling to [0, 1] is written straight into a preallocated float32 buffer
+  that is reused across calls instead of allocating two float copies per image.
+
+tests/test_preprocessing.py checks the fast path against the original
+full-resolution pipeline on synthetic JPEG and PNG images; run this module to
+do the same comparison on real photos:
+
+    python preprocessing.py leaf1.jpg leaf2.png --tolerance 0.02
+"""
+import argparse
+import sys
+import threading
+
+import numpy as np
+from PIL import Image
+
+TARGET_SIZE = (128, 128)
+# Decode at no less than twice the target size so the final bicubic resize
+# still has enough pixels to match the full-resolution pipeline closely.
+DRAFT_FACTOR = 2
+REDUCING_GAP = 2.0
+_SCALE = np.float32(1.0 / 255.0)
+
+def open_image(source, min_size=None):
+    """
+    Opens an image from a path or file-like object and converts it to RGB.
+    JPEGs are decoded at the smallest DCT scale that is still at least
+    `min_size` (default: twice the model input size).
+    """
+    if min_size is None:
+        min_size = (TARGET_SIZE[0] * DRAFT_FACTOR, TARGET_SIZE[1] * DRAFT_FACTOR)
+    img = Image.open(source)
+    if img.format == "JPEG":
+        img.draft("RGB", min_size)
+    return img.convert("RGB")
+
+def resize(img, size=TARGET_SIZE):
+    """
+    Resizes an RGB image to the model input size in uint8.
+    """
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    if img.size == size:
+        return img
+    return img.resize(size, Image.BICUBIC, reducing_gap=REDUCING_GAP)
+
+def to_array(img, out=None):
+    """
+    Scales a resized RGB image to float32 in [0, 1], writing into `out` if given.
+    """
+    pixels = np.asarray(img, dtype=np.uint8)
+    if out is None:
+        out = np.empty(pixels.shape, dtype=np.float32)
+    np.multiply(pixels, _SCALE, out=out, casting="unsafe")
+    return out
+
+class Preprocessor:
+    """
+    Turns PIL images into model-ready batches using a per-thread float32
+    buffer that is reused across calls.
+
+    The arrays returned by `batch()` are views into that buffer and are
+    overwritten by the next call from the same thread, so they must be
+    consumed (e.g. passed to the model) before preprocessing the next batch.
+    """
+
+    def __init__(self, size=TARGET_SIZE):
+        self.size = size
+        self._local = threading.local()
+
+    def _buffer(self, n):
+        buf = getattr(self._local, "buffer", None)
+        if buf is None or len(buf) < n:
+            buf = np.empty((n, self.size[1], self.size[0], 3), dtype=np.float32)
+            self._local.buffer = buf
+        return buf
+
+    def batch(self, images):
+        """
+        Preprocesses a list of PIL images into an (N, H, W, 3) float32 view of the buffer.
+        """
+        buf = self._buffer(len(images))
+        for i, img in enumerate(images):
+            to_array(resize(img, self.size), out=buf[i])
+        return buf[:len(images)]
+
+def reference_preprocess(source, size=TARGET_SIZE):
+    """
+    The original pipeline: full-resolution decode, default resize, then scale.
+    """
+    img = Image.open(source).convert("RGB").resize(size)
+    return np.asarray(img, dtype=np.float32) / 255.0
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare fast preprocessing with the original pipeline.")
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="Maximum allowed mean absolute difference.")
+    args = parser.parse_args()
+
+    preprocessor = Preprocessor()
+    failed = False
+    for path in args.images:
+        fast = preprocessor.batch([open_image(path)])[0]
+        diff = np.abs(fast - reference_preprocess(path))
+        ok = diff.mean() <= args.tolerance
+        failed = failed or not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {path}: mean abs diff {diff.mean():.4f}, max {diff.max():.4f}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
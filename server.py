@@ -0,0 +1,363 @@
+"""
+Standalone inference HTTP service for the mobile client and partner integrations.
+
+Runs on the standard library's asyncio server, so it needs nothing beyond the
+app's own dependencies. Concurrent requests are coalesced by a dynamic
+batcher: the model is called once a batch reaches --max-batch-size or the
+oldest request has waited --max-wait-ms. When --max-queue prediction requests
+are already in flight (reading their body, decoding, queued or in a batch),
+new ones are rejected with 503 and a Retry-After header before their body is
+read, which bounds both the queue and the memory held by request bodies.
+
+Endpoints:
+    GET  /health    readiness and queue depth (503 until the model is loaded)
+    GET  /metrics   stage latencies and prediction counts in Prometheus text format
+    POST /predict   the image as multipart/form-data (field "file" or "image"),
+                    a raw image/* body, or JSON {"image": "<base64>"}
+
+Usage:
+    python server.py --port 8080 --max-batch-size 32 --max-wait-ms 5
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import BytesParser
+from email.policy import default as email_policy
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+import inference
+import metrics
+import model_loader
+from Diseases_info import DISEASE_INFO
+
+MAX_BODY_BYTES = 25 * 1024 * 1024
+HEADER_TIMEOUT_S = 30
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+class HTTPError(Exception):
+    """
+    An error that maps directly onto an HTTP error response.
+    """
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+class Overloaded(HTTPError):
+    def __init__(self, message="Server is overloaded, retry shortly."):
+        super().__init__(503, message, {"Retry-After": "1"})
+
+# --- 1. DYNAMIC BATCHING ---
+class DynamicBatcher:
+    """
+    Coalesces single-image requests into model batches.
+
+    `submit()` queues one preprocessed (128, 128, 3) array and resolves to its
+    probability vector. A single worker task takes the oldest request, keeps
+    collecting until `max_batch_size` requests are in hand or `max_wait_ms`
+    has passed, then runs the whole batch through `predict_fn` on a
+    dedicated thread so the event loop keeps accepting connections.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=5.0, max_queue=256):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue = max_queue
+        self._queue = None
+        self._task = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="batcher")
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        self._executor.shutdown(wait=False)
+
+    @property
+    def depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, array):
+        if self._queue.qsize() >= self.max_queue:
+            raise Overloaded()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((array, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        items = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(items) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Requests whose client went away don't need a slot in the batch.
+        return [(array, future) for array, future in items if not future.cancelled()]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = await self._collect()
+            if not items:
+                continue
+            batch = np.stack([array for array, _ in items])
+            try:
+                probabilities = await loop.run_in_executor(self._executor, self.predict_fn, batch)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), p in zip(items, probabilities):
+                if not future.done():
+                    future.set_result(p)
+
+# --- 2. REQUEST PARSING ---
+def extract_image_bytes(headers, body):
+    """
+    Pulls the uploaded image out of a multipart, JSON or raw request body.
+    """
+    content_type = headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        message = BytesParser(policy=email_policy).parsebytes(
+            b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body
+        )
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if name in ("file", "image"):
+                return part.get_payload(decode=True)
+        raise HTTPError(400, 'Multipart body has no "file" or "image" field.')
+    if content_type.startswith("application/json"):
+        try:
+            return base64.b64decode(json.loads(body)["image"], validate=True)
+        except (ValueError, KeyError, TypeError):
+            raise HTTPError(400, 'JSON body must be {"image": "<base64>"}.')
+    if not body:
+        raise HTTPError(400, "Request body is empty.")
+    return body
+
+def parse_top_k(query, default, num_classes):
+    """
+    Reads the `top_k` query parameter as an integer between 1 and `num_classes`.
+    """
+    value = query.get("top_k", [default])[0]
+    try:
+        top_k = int(value)
+    except (TypeError, ValueError):
+        raise HTTPError(400, f"top_k must be an integer, got {value!r}.")
+    if not 1 <= top_k <= num_classes:
+        raise HTTPError(400, f"top_k must be between 1 and {num_classes}.")
+    return top_k
+
+def decode_image(data):
+    """
+    Decodes and preprocesses uploaded bytes into a fresh (128, 128, 3) array.
+    """
+    try:
+        return inference.preprocess(inference.load_image(io.BytesIO(data)))
+    except Exception as e:
+        raise HTTPError(400, f"Could not decode image: {e}")
+
+# --- 3. HTTP SERVER ---
+class InferenceServer:
+    """
+    Minimal HTTP/1.1 server (one request per connection) in front of the batcher.
+    """
+
+    def __init__(self, loader, labels, max_batch_size=32, max_wait_ms=5.0, max_queue=256,
+                 decode_workers=4, top_k=3):
+        self.loader = loader
+        self.labels = labels
+        self.top_k = top_k
+        self.batcher = DynamicBatcher(
+            self._predict,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            max_queue=max_queue
+        )
+        self._decode_executor = ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix="decode")
+        # /predict requests between admission and response. Only touched on
+        # the event loop, so it needs no lock.
+        self.in_flight = 0
+
+    def _predict(self, batch):
+        with metrics.timed("model"):
+            return self.loader.backend.predict(batch)
+
+    async def health(self):
+        ready = self.loader.ready
+        payload = {
+            "status": "ok" if ready else self.loader.state,
+            "queue_depth": self.batcher.depth,
+            "in_flight": self.in_flight,
+            "max_queue": self.batcher.max_queue,
+        }
+        if self.loader.error is not None:
+            payload["error"] = str(self.loader.error)
+        return (200 if ready else 503), payload
+
+    async def predict(self, headers, body, query):
+        if not self.loader.ready:
+            raise HTTPError(503, f"Model is {self.loader.state}.", {"Retry-After": "5"})
+        start = time.perf_counter()
+        top_k = parse_top_k(query, self.top_k, len(self.labels))
+        data = extract_image_bytes(headers, body)
+        loop = asyncio.get_running_loop()
+        array = await loop.run_in_executor(self._decode_executor, decode_image, data)
+        probabilities = await self.batcher.submit(array)
+
+        with metrics.timed("label_lookup"):
+            ranked = np.argsort(probabilities)[::-1][:top_k]
+            label = self.labels[int(ranked[0])]
+        metrics.record_prediction(label, float(probabilities[ranked[0]]))
+        return 200, {
+            "label": label,
+            "display_label": inference.format_label(label),
+            "confidence": float(probabilities[ranked[0]]),
+            "top_k": [
+                {"label": self.labels[int(i)], "confidence": float(probabilities[i])}
+                for i in ranked
+            ],
+            "advisory": DISEASE_INFO.get(label),
+            "latency_ms": (time.perf_counter() - start) * 1000,
+        }
+
+    async def route(self, method, target, headers, body):
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        if url.path == "/health":
+            if method != "GET":
+                raise HTTPError(405, "Use GET /health.")
+            return await self.health()
+        if url.path == "/metrics":
+            if method != "GET":
+                raise HTTPError(405, "Use GET /metrics.")
+            return 200, metrics.render()
+        if url.path == "/predict":
+            if method != "POST":
+                raise HTTPError(405, "Use POST /predict.")
+            return await self.predict(headers, body, query)
+        raise HTTPError(404, f"No route for {url.path}.")
+
+    async def read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            raise asyncio.IncompleteReadError(b"", None)
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, value = line.decode("latin-1").split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+        return method, target, headers
+
+    async def handle(self, reader, writer):
+        extra_headers = {}
+        try:
+            try:
+                method, target, headers = await asyncio.wait_for(self.read_request(reader), HEADER_TIMEOUT_S)
+                length = int(headers.get("content-length", 0))
+            except (ValueError, asyncio.TimeoutError):
+                raise HTTPError(400, "Malformed request.")
+            if length > MAX_BODY_BYTES:
+                raise HTTPError(413, f"Body exceeds {MAX_BODY_BYTES} bytes.")
+            admitted = method == "POST" and urlsplit(target).path == "/predict"
+            if admitted:
+                if self.in_flight >= self.batcher.max_queue:
+                    raise Overloaded()
+                self.in_flight += 1
+            try:
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self.route(method, target, headers, body)
+            finally:
+                if admitted:
+                    self.in_flight -= 1
+        except HTTPError as e:
+            status, payload, extra_headers = e.status, {"error": e.message}, e.headers
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except Exception as e:
+            status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+        head = [
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            "Connection: close",
+        ]
+        head += [f"{name}: {value}" for name, value in extra_headers.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+async def serve(host, port, **kwargs):
+    loader = model_loader.ModelLoader().start()
+    server = InferenceServer(loader, inference.load_labels(), **kwargs)
+    server.batcher.start()
+    http_server = await asyncio.start_server(server.handle, host, port)
+    print(f"Serving on http://{host}:{port} (model is {loader.state})")
+    try:
+        async with http_server:
+            await http_server.serve_forever()
+    finally:
+        await server.batcher.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Plant disease inference HTTP service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="Longest a request waits for its batch to fill.")
+    parser.add_argument("--max-queue", type=int, default=256, help="Prediction requests in flight before returning 503.")
+    parser.add_argument("--decode-workers", type=int, default=4)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(
+            args.host,
+            args.port,
+            max_batch_size=args.max_batch_size,
+            max_wait_ms=args.max_wait_ms,
+            max_queue=args.max_queue,
+            decode_workers=args.decode_workers,
+        ))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import json
+
+import backends
+import inference
+from cache import file_digest
+
+def write_manifest(tmp_path, model, **overrides):
+    manifest = {
+        "source_sha256": file_digest(str(model)),
+        "reference": {"p50_ms": 10.0},
+        "artifacts": [
+            {"name": "float16", "path": "model_float16.tflite", "accuracy_drop": 0.0, "p50_ms": 6.0},
+            {"name": "int8", "path": "model_int8.tflite", "accuracy_drop": 0.005, "p50_ms": 3.0},
+        ],
+    }
+    manifest.update(overrides)
+    path = tmp_path / "manifest.json"
+    path.write_text(json.dumps(manifest))
+    return str(path)
+
+def test_select_artifact_picks_fastest_acceptable(tmp_path):
+    model = tmp_path / "model.keras"
+    model.write_bytes(b"weights")
+    manifest = write_manifest(tmp_path, model)
+    assert backends.select_artifact(manifest, 0.01, str(model))["name"] == "int8"
+    assert backends.select_artifact(manifest, 0.001, str(model))["name"] == "float16"
+
+def test_select_artifact_rejects_manifest_for_another_model(tmp_path, capsys):
+    model = tmp_path / "model.keras"
+    model.write_bytes(b"weights")
+    manifest = write_manifest(tmp_path, model)
+    model.write_bytes(b"retrained weights")
+    assert backends.select_artifact(manifest, 0.01, str(model)) is None
+    assert "different" in capsys.readouterr().out
+
+def test_served_model_paths_follow_the_backend(monkeypatch):
+    for name in ("PLANT_BACKEND", "PLANT_CASCADE_MODEL", "PLANT_TFLITE_MODEL"):
+        monkeypatch.delenv(name, raising=False)
+    assert inference.served_model_paths() == [inference.MODEL_PATH]
+    config = {"backend": "tflite", "tflite_path": "model_int8.tflite", "cascade_model": "cheap.tflite"}
+    assert inference.served_model_paths(config) == ["model_int8.tflite", "cheap.tflite"]
@@ -0,0 +1,29 @@
+import benchmark
+
+def results_with(p50_ms=10.0, images_per_s=100.0, stage_rss_mb=50.0):
+    return {
+        "stages": {"decode_full/jpeg/4032x3024": {"p50_ms": p50_ms}},
+        "inference": {"8": {"images_per_s": images_per_s}},
+        "memory": {"decode_full/jpeg/4032x3024": {"stage_rss_mb": stage_rss_mb, "peak_rss_mb": 120.0}},
+    }
+
+def test_compare_passes_within_threshold():
+    assert benchmark.compare(results_with(p50_ms=10.5, stage_rss_mb=52), results_with(), 0.10) == []
+
+def test_compare_flags_latency_throughput_and_memory_regressions():
+    regressions = benchmark.compare(results_with(p50_ms=20, images_per_s=50, stage_rss_mb=200), results_with(), 0.10)
+    assert len(regressions) == 3
+    assert any("memory" in r for r in regressions)
+
+def test_compare_ignores_small_absolute_memory_growth():
+    baseline = results_with(stage_rss_mb=1.0)
+    assert benchmark.compare(results_with(stage_rss_mb=1.0 + benchmark.RSS_SLACK_MB / 2), baseline, 0.10) == []
+
+def test_stage_memory_is_measured_in_a_fresh_process(tmp_path):
+    path = tmp_path / "photo.jpeg"
+    path.write_bytes(benchmark.synthetic_image(3000, 2000, "jpeg"))
+    memory = benchmark.measure_image_memory(str(path))
+    assert set(memory) == {"decode_full", "decode_draft", "end_to_end"}
+    # A full 3000x2000 RGB decode needs ~17 MB; the draft decode only a fraction.
+    assert memory["decode_full"]["stage_rss_mb"] > 10
+    assert memory["decode_draft"]["stage_rss_mb"] < memory["decode_full"]["stage_rss_mb"]
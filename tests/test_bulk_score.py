@@ -0,0 +1,82 @@
+import json
+
+import numpy as np
+import pytest
+
+import bulk_score
+
+class FixedBackend:
+    def __init__(self, num_classes=3):
+        self.num_classes = num_classes
+        self.batch_shapes = []
+
+    def predict(self, batch):
+        self.batch_shapes.append(batch.shape)
+        probabilities = np.zeros((len(batch), self.num_classes), dtype=np.float32)
+        probabilities[:, 1] = 0.8
+        probabilities[:, 0] = 0.2
+        return probabilities
+
+def test_checkpoint_round_trip(tmp_path):
+    path = str(tmp_path / "run.ckpt")
+    digest = bulk_score.inputs_digest(["a.jpg", "b.jpg"])
+    assert bulk_score.load_checkpoint(path, digest) is None
+    bulk_score.save_checkpoint(path, {"inputs_digest": digest, "done": 1, "offset": 10})
+    assert bulk_score.load_checkpoint(path, digest)["done"] == 1
+
+def test_checkpoint_for_other_inputs_is_rejected(tmp_path):
+    path = str(tmp_path / "run.ckpt")
+    bulk_score.save_checkpoint(path, {"inputs_digest": bulk_score.inputs_digest(["a.jpg"]), "done": 1})
+    with pytest.raises(SystemExit):
+        bulk_score.load_checkpoint(path, bulk_score.inputs_digest(["b.jpg"]))
+
+def test_writer_resumes_at_checkpointed_offset(tmp_path):
+    path = str(tmp_path / "out.jsonl")
+    writer = bulk_score.ResultWriter(path, "jsonl")
+    writer.write({"path": "a.jpg"})
+    offset = writer.sync()
+    writer.write({"path": "partial.jpg"})
+    writer.close()
+
+    writer = bulk_score.ResultWriter(path, "jsonl", offset)
+    writer.write({"path": "b.jpg"})
+    writer.close()
+    with open(path) as f:
+        assert [json.loads(line)["path"] for line in f] == ["a.jpg", "b.jpg"]
+
+def test_writer_keeps_csv_header_on_resume(tmp_path):
+    path = str(tmp_path / "out.csv")
+    writer = bulk_score.ResultWriter(path, "csv")
+    writer.write({"path": "a.jpg", "label": "x", "confidence": 0.5, "error": None})
+    offset = writer.sync()
+    writer.close()
+
+    writer = bulk_score.ResultWriter(path, "csv", offset)
+    writer.write({"path": "b.jpg", "label": "y", "confidence": 0.5, "error": None})
+    writer.close()
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert lines[0] == ",".join(bulk_score.CSV_FIELDS)
+    assert len(lines) == 3
+
+@pytest.mark.parametrize("contents", [None, "short"])
+def test_writer_refuses_missing_or_short_output(tmp_path, contents):
+    path = tmp_path / "out.jsonl"
+    if contents is not None:
+        path.write_text(contents)
+    with pytest.raises(SystemExit):
+        bulk_score.ResultWriter(str(path), "jsonl", offset=100)
+
+def test_score_batch_pads_to_fixed_size_and_reports_errors():
+    backend = FixedBackend()
+    labels = {0: "a", 1: "b", 2: "c"}
+    decoded = [
+        ("one.jpg", np.zeros((4, 4, 3), dtype=np.float32), None),
+        ("bad.jpg", None, "OSError: truncated"),
+        ("two.jpg", np.zeros((4, 4, 3), dtype=np.float32), None),
+    ]
+    rows = bulk_score.score_batch(backend, labels, decoded, batch_size=8)
+    assert backend.batch_shapes == [(8, 4, 4, 3)]
+    assert [r["path"] for r in rows] == ["one.jpg", "bad.jpg", "two.jpg"]
+    assert rows[0]["label"] == "b" and rows[0]["confidence"] == pytest.approx(0.8)
+    assert rows[1]["label"] is None and rows[1]["error"] == "OSError: truncated"
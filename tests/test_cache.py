@@ -0,0 +1,85 @@
+import cache
+
+def write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+def make_cache(tmp_path, **kwargs):
+    model = tmp_path / "model.bin"
+    if not model.exists():
+        write(model, b"weights v1")
+    return cache.PredictionCache(cache.FileFingerprint([str(model)]), **kwargs), model
+
+def test_file_digest_matches_hash_bytes(tmp_path):
+    path = tmp_path / "blob"
+    write(path, b"x" * 3_000_000)
+    assert cache.file_digest(str(path), chunk_size=1 << 16) == cache.hash_bytes(b"x" * 3_000_000)
+
+def test_fingerprint_changes_with_file_contents(tmp_path):
+    path = tmp_path / "model.bin"
+    write(path, b"v1")
+    fingerprint = cache.FileFingerprint([str(path)])
+    first = fingerprint.digest
+    assert fingerprint.digest == first
+    write(path, b"v2-longer")
+    assert fingerprint.digest != first
+
+def test_fingerprint_handles_missing_files(tmp_path):
+    fingerprint = cache.FileFingerprint([str(tmp_path / "missing")])
+    assert fingerprint.digest
+
+def test_hit_miss_and_stats(tmp_path):
+    predictions, _ = make_cache(tmp_path)
+    assert predictions.get(b"image") is None
+    predictions.put(b"image", {"label": "a"})
+    assert predictions.get(b"image") == {"label": "a"}
+    stats = predictions.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["hit_rate"] == 0.5
+
+def test_lru_evicts_least_recently_used(tmp_path):
+    predictions, _ = make_cache(tmp_path, max_entries=2)
+    predictions.put(b"a", 1)
+    predictions.put(b"b", 2)
+    predictions.get(b"a")
+    predictions.put(b"c", 3)
+    assert predictions.get(b"b") is None
+    assert predictions.get(b"a") == 1 and predictions.get(b"c") == 3
+
+def test_model_change_invalidates_entries(tmp_path):
+    predictions, model = make_cache(tmp_path)
+    predictions.put(b"image", {"label": "a"})
+    write(model, b"weights v2, retrained")
+    assert predictions.get(b"image") is None
+
+def test_sqlite_tier_survives_restart(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    first, _ = make_cache(tmp_path, db_path=db_path)
+    first.put(b"image", {"label": "a"})
+
+    second, _ = make_cache(tmp_path, db_path=db_path)
+    assert second.get(b"image") == {"label": "a"}
+    assert second.stats()["disk_hits"] == 1
+
+def test_create_cache_respects_size_setting(tmp_path, monkeypatch):
+    model = tmp_path / "model.bin"
+    write(model, b"weights")
+    monkeypatch.setenv("PLANT_CACHE_SIZE", "0")
+    assert cache.create_cache([str(model)], str(model)) is None
+    monkeypatch.setenv("PLANT_CACHE_SIZE", "5")
+    monkeypatch.delenv("PLANT_CACHE_DB", raising=False)
+    assert cache.create_cache([str(model)], str(model)).max_entries == 5
+
+def test_missing_model_leaves_the_disk_tier_alone(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    predictions, model = make_cache(tmp_path, db_path=db_path)
+    predictions.put(b"image", {"label": "a"})
+    model.unlink()
+
+    # After a restart the model may not be downloaded yet: a miss, not a purge.
+    restarted = cache.PredictionCache(cache.FileFingerprint([str(model)]), db_path=db_path)
+    assert restarted.get(b"image") is None
+    restarted.put(b"other", {"label": "b"})
+    write(model, b"weights v1")
+    assert restarted.get(b"image") == {"label": "a"}
+    assert restarted.get(b"other") is None
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+import cascade
+
+# Cheap-model outputs with top-1 confidence 0.9, 0.6, 0.7 and 0.4.
+CHEAP = np.array([
+    [0.9, 0.05, 0.05],
+    [0.6, 0.3, 0.1],
+    [0.2, 0.7, 0.1],
+    [0.4, 0.35, 0.25],
+], dtype=np.float32)
+FULL = np.array([
+    [1.0, 0.0, 0.0],
+    [0.0, 1.0, 0.0],
+    [0.0, 1.0, 0.0],
+    [0.0, 0.0, 1.0],
+], dtype=np.float32)
+TARGETS = np.array([0, 1, 1, 2])
+
+class TableBackend:
+    """
+    Stand-in backend that answers row i of `table` for an input filled with i.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.calls = []
+
+    def predict(self, batch):
+        rows = batch.reshape(len(batch), -1)[:, 0].astype(int)
+        self.calls.append(list(rows))
+        return self.table[rows]
+
+def inputs():
+    return np.arange(len(CHEAP), dtype=np.float32).reshape(-1, 1, 1, 1)
+
+def test_top_two():
+    confidence, margin = cascade.top_two(CHEAP)
+    assert np.allclose(confidence, [0.9, 0.6, 0.7, 0.4])
+    assert np.allclose(margin, [0.85, 0.3, 0.5, 0.05])
+
+def test_only_escalated_rows_reach_the_full_model():
+    cheap, full = TableBackend(CHEAP), TableBackend(FULL)
+    backend = cascade.CascadeBackend(cheap, full, confidence_threshold=0.65, margin_threshold=0.0)
+    probabilities, routes = backend.predict_routed(inputs())
+
+    assert cheap.calls == [[0, 1, 2, 3]] and full.calls == [[1, 3]]
+    assert np.allclose(probabilities, [CHEAP[0], FULL[1], CHEAP[2], FULL[3]])
+    assert [r["route"] for r in routes] == ["cheap", "full", "cheap", "full"]
+    assert routes[1]["cheap_confidence"] == pytest.approx(0.6)
+    assert routes[1]["cheap_margin"] == pytest.approx(0.3)
+    assert all(r["confidence_threshold"] == 0.65 and r["margin_threshold"] == 0.0 for r in routes)
+
+def test_margin_threshold_escalates_close_calls():
+    full = TableBackend(FULL)
+    backend = cascade.CascadeBackend(TableBackend(CHEAP), full, confidence_threshold=0.5, margin_threshold=0.4)
+    assert list(backend.escalate(CHEAP)) == [False, True, False, True]
+    backend.predict_routed(inputs())
+    assert full.calls == [[1, 3]]
+
+def test_confident_batch_never_calls_the_full_model():
+    full = TableBackend(FULL)
+    backend = cascade.CascadeBackend(TableBackend(CHEAP), full, confidence_threshold=0.1)
+    _, routes = backend.predict_routed(inputs())
+    assert full.calls == [] and {r["route"] for r in routes} == {"cheap"}
+
+def test_routes_are_counted():
+    before = dict(cascade.ROUTES._values)
+    cascade.CascadeBackend(TableBackend(CHEAP), TableBackend(FULL), 0.65).predict_routed(inputs())
+    after = cascade.ROUTES._values
+    assert after[("cheap",)] - before.get(("cheap",), 0) == 2
+    assert after[("full",)] - before.get(("full",), 0) == 2
+
+def test_sweep_accuracy_and_compute():
+    rows = cascade.sweep(CHEAP, FULL, TARGETS, cheap_ms=1.0, full_ms=10.0, thresholds=[0.5, 0.65, 0.95])
+    # 0.5 escalates row 3, 0.65 rows 1 and 3, 0.95 every row.
+    assert [r["accuracy"] for r in rows] == [0.75, 1.0, 1.0]
+    assert [r["escalated"] for r in rows] == [0.25, 0.5, 1.0]
+    assert [r["avg_ms"] for r in rows] == pytest.approx([3.5, 6.0, 11.0])
+    assert [r["relative_compute"] for r in rows] == pytest.approx([0.35, 0.6, 1.1])
+
+def test_sweep_with_margin_threshold():
+    rows = cascade.sweep(CHEAP, FULL, TARGETS, 1.0, 10.0, [0.5], margin_threshold=0.35)
+    assert rows[0]["accuracy"] == 1.0 and rows[0]["escalated"] == 0.5
@@ -0,0 +1,163 @@
+import io
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import embedding_index
+import feedback_log
+import inference
+
+class MeanColorBackend:
+    """
+    Stand-in for the Keras backend whose embedding is the mean RGB colour.
+    """
+
+    def predict_with_embeddings(self, batch):
+        embeddings = batch.mean(axis=(1, 2))
+        return np.tile([[0.5, 0.5]], (len(batch), 1)), embeddings
+
+def png(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+@pytest.fixture
+def index(tmp_path):
+    return embedding_index.EmbeddingIndex(str(tmp_path / "index"), chunk_rows=4)
+
+def test_build_from_the_log_is_searchable_from_the_app(tmp_path, monkeypatch):
+    model = tmp_path / "final_model.keras"
+    model.write_bytes(b"weights")
+    monkeypatch.setattr(inference, "MODEL_PATH", str(model))
+    configs = []
+    monkeypatch.setattr(inference, "load_backend", lambda config, **kwargs: configs.append(config) or MeanColorBackend())
+
+    log = feedback_log.PredictionLog(
+        db_path=str(tmp_path / "predictions.db"), image_dir=str(tmp_path / "images"), flush_interval=0.05
+    )
+    colors = {"Tomato___healthy": (20, 200, 20), "Tomato___Late_blight": (120, 80, 40)}
+    for label, color in colors.items():
+        log.record_feedback(log.log_prediction(png(color), label, 0.9, [0.9]), True)
+    assert log.flush(timeout=5)
+    log.close()
+
+    index = embedding_index.EmbeddingIndex(str(tmp_path / "index"))
+    assert embedding_index.build(index, log.db_path) == 2
+    assert embedding_index.build(index, log.db_path) == 0
+    # Embeddings come from the Keras model whatever PLANT_BACKEND is set to.
+    assert configs[0] == {"backend": "keras", "cascade_model": None}
+
+    # The app checks the index against its own fingerprint of the model before searching.
+    assert index.compatible_with(embedding_index.model_fingerprint(inference.MODEL_PATH).digest)
+    query = np.array([22, 190, 25], dtype=np.float32) / 255
+    assert index.search(query, k=1)[0]["label"] == "Tomato___healthy"
+
+    model.write_bytes(b"retrained weights")
+    assert not index.compatible_with(embedding_index.model_fingerprint(inference.MODEL_PATH).digest)
+
+def test_search_returns_exact_top_k_across_chunks(index):
+    vectors = np.random.default_rng(0).normal(size=(50, 8)).astype(np.float32)
+    ids = [f"case-{i}" for i in range(50)]
+    assert index.add(vectors[:30], ["a"] * 30, ids[:30]) == 30
+    assert index.add(vectors[30:], ["b"] * 20, ids[30:]) == 20
+
+    query = vectors[7] + 0.01
+    expected = np.argsort(-(embedding_index.normalize(vectors) @ embedding_index.normalize(query)[0]))[:5]
+    assert [n["row"] for n in index.search(query, k=5)] == list(expected)
+    batch = index.search(vectors[:3], k=1)
+    assert [result[0]["case_id"] for result in batch] == ids[:3]
+
+def test_add_skips_known_cases_and_search_excludes_shas(index):
+    vectors = np.eye(3, dtype=np.float32)
+    index.add(vectors, ["a", "b", "c"], ["1", "2", "3"], image_shas=["s1", "s2", "s3"])
+    assert index.add(vectors[:1], ["a"], ["1"]) == 0
+    assert len(index) == 3 and "2" in index
+    neighbors = index.search([1.0, 0.1, 0.0], k=2, exclude_shas={"s1"})
+    assert [n["case_id"] for n in neighbors] == ["2", "3"]
+
+def test_add_rejects_other_dimensions_and_models(index):
+    index.add(np.ones((1, 4)), ["a"], ["1"], model_digest="first")
+    with pytest.raises(ValueError):
+        index.add(np.ones((1, 5)), ["a"], ["2"], model_digest="first")
+    with pytest.raises(ValueError):
+        index.add(np.ones((1, 4)), ["a"], ["3"], model_digest="second")
+    assert len(index) == 1
+
+def test_empty_index_returns_no_neighbors(index):
+    assert index.search([1.0, 0.0], k=3) == []
+    assert index.compatible_with("anything")
+
+def test_embed_returns_the_backend_embedding():
+    img = Image.new("RGB", (200, 150), (255, 0, 0))
+    embedding = inference.embed(MeanColorBackend(), img)
+    assert np.allclose(embedding, [1.0, 0.0, 0.0], atol=1e-3)
+
+def clustered(rng, rows, dim=16, clusters=40):
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    return centers[rng.integers(clusters, size=rows)] + 0.3 * rng.normal(size=(rows, dim)).astype(np.float32)
+
+def test_ivf_search_finds_trained_and_appended_rows(index):
+    rng = np.random.default_rng(0)
+    vectors = clustered(rng, 1200)
+    index.add(vectors[:1000], ["a"] * 1000, [str(i) for i in range(1000)])
+    assert index.train_ivf(num_lists=20) == 20
+    index.add(vectors[1000:], ["b"] * 200, [str(i) for i in range(1000, 1200)])
+
+    for row in (3, 500, 1100):
+        ivf = index.search(vectors[row], k=3)
+        exact = index.search(vectors[row], k=3, exact=True)
+        assert ivf[0]["row"] == row
+        assert ivf[0]["score"] == pytest.approx(exact[0]["score"])
+
+def test_ivf_recall_on_clustered_data(index):
+    rng = np.random.default_rng(1)
+    index.add(clustered(rng, 2000), ["a"] * 2000, [str(i) for i in range(2000)])
+    index.train_ivf()
+    queries = clustered(rng, 50)
+    approximate = index.search(queries, k=5)
+    exact = index.search(queries, k=5, exact=True)
+    recall = np.mean([
+        len({n["row"] for n in a} & {n["row"] for n in e}) / 5 for a, e in zip(approximate, exact)
+    ])
+    assert recall >= 0.9
+
+def test_ivf_lists_from_a_larger_index_are_ignored(tmp_path, index):
+    vectors = np.random.default_rng(2).normal(size=(100, 8))
+    index.add(vectors, ["a"] * 100, [str(i) for i in range(100)])
+    index.train_ivf(num_lists=4)
+    smaller = embedding_index.EmbeddingIndex(str(tmp_path / "smaller"))
+    smaller.add(vectors[:10], ["a"] * 10, [str(i) for i in range(10)])
+    os.replace(index.ivf_path, smaller.ivf_path)
+    assert smaller.search(vectors[5], k=1)[0]["row"] == 5
+
+def test_cascade_answers_from_the_embedding_pass():
+    import cascade
+
+    class Cheap:
+        def predict(self, batch):
+            raise AssertionError("the cheap model should not run when an embedding is needed")
+
+    backend = cascade.CascadeBackend(Cheap(), MeanColorBackend(), confidence_threshold=0.8)
+    img = Image.new("RGB", (64, 64), (0, 255, 0))
+    probabilities, embedding, route = inference.predict_with_embedding_routed(backend, img)
+    assert np.allclose(probabilities, [0.5, 0.5])
+    assert np.allclose(embedding, [0.0, 1.0, 0.0], atol=1e-3)
+    assert route["route"] == "embedding" and route["confidence_threshold"] == 0.8
+
+def test_appends_trigger_background_retraining(index, monkeypatch):
+    monkeypatch.setattr(embedding_index, "IVF_MIN_ROWS", 100)
+    rng = np.random.default_rng(3)
+    index.add(clustered(rng, 99), ["a"] * 99, [str(i) for i in range(99)])
+    assert index.maybe_train_async() is None
+
+    index.add(clustered(rng, 1), ["a"], ["99"])
+    index.maybe_train_async().join()
+    assert int(index._ivf(len(index))["rows"]) == 100
+
+    index.add(clustered(rng, 20), ["a"] * 20, [str(i) for i in range(100, 120)])
+    assert not index.needs_training()
+    index.add(clustered(rng, 1), ["a"], ["120"])
+    index.maybe_train_async().join()
+    assert int(index._ivf(len(index))["rows"]) == 121
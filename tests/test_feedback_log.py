@@ -0,0 +1,67 @@
+import json
+import os
+
+import pytest
+
+import feedback_log
+
+JPEG = b"\xff\xd8\xff" + b"leaf" * 100
+
+@pytest.fixture
+def log(tmp_path):
+    log = feedback_log.PredictionLog(
+        db_path=str(tmp_path / "predictions.db"), image_dir=str(tmp_path / "images"), flush_interval=0.05
+    )
+    yield log
+    log.close()
+
+def test_predictions_and_feedback_are_committed_and_exported(log, tmp_path):
+    first = log.log_prediction(JPEG, "Tomato___healthy", 0.9, [0.1, 0.9], "digest", "single")
+    second = log.log_prediction(b"\x89PNG other", "Tomato___Early_blight", 0.6, [0.6, 0.4])
+    log.record_feedback(first, True)
+    log.record_feedback(second, False, "Tomato___Late_blight")
+    assert log.flush(timeout=5)
+
+    output = tmp_path / "export.jsonl"
+    assert feedback_log.export(log.db_path, str(output), with_feedback=True) == 2
+    rows = {r["id"]: r for r in map(json.loads, output.read_text().splitlines())}
+    assert rows[first]["helpful"] is True and rows[first]["probabilities"] == [0.1, 0.9]
+    assert rows[second]["correct_label"] == "Tomato___Late_blight"
+    assert os.path.exists(rows[first]["image_path"]) and rows[first]["image_path"].endswith(".jpg")
+
+def test_confirmed_predictions_use_the_corrected_label(log):
+    confirmed = log.log_prediction(JPEG, "Tomato___healthy", 0.9, [0.9])
+    corrected = log.log_prediction(JPEG + b"2", "Tomato___healthy", 0.5, [0.5])
+    unhelpful = log.log_prediction(JPEG + b"3", "Tomato___healthy", 0.5, [0.5])
+    log.log_prediction(JPEG + b"4", "Tomato___healthy", 0.5, [0.5])
+    log.record_feedback(confirmed, True)
+    log.record_feedback(corrected, False, "Potato___Early_blight")
+    log.record_feedback(unhelpful, False)
+    assert log.flush(timeout=5)
+
+    cases = {case[0]: case for case in feedback_log.confirmed_predictions(log.db_path)}
+    assert set(cases) == {confirmed, corrected}
+    assert cases[confirmed][1] == "Tomato___healthy"
+    assert cases[corrected][1] == "Potato___Early_blight"
+
+def test_image_path_is_stable_per_content_hash(log):
+    sha = "ab" * 32
+    assert log.image_path(sha, JPEG) == os.path.join(log.image_dir, "ab", sha + ".jpg")
+
+def test_pending_image_bytes_are_bounded(tmp_path):
+    log = feedback_log.PredictionLog(
+        db_path=str(tmp_path / "p.db"), image_dir=str(tmp_path / "images"), max_pending_bytes=len(JPEG) * 2
+    )
+    try:
+        log.log_prediction(b"\xff\xd8\xff" + b"x" * (len(JPEG) * 3), "a", 0.5, [0.5])
+        assert log.dropped == 1
+        assert log.pending_bytes <= log.max_pending_bytes
+        log.log_prediction(JPEG, "a", 0.5, [0.5])
+        assert log.flush(timeout=5)
+        assert log.dropped == 1 and log.pending_bytes == 0
+    finally:
+        log.close()
+
+def test_create_log_can_be_disabled(monkeypatch):
+    monkeypatch.setenv("PLANT_LOG_DIR", "")
+    assert feedback_log.create_log() is None
@@ -0,0 +1,43 @@
+import hashlib
+import sys
+import types
+
+import pytest
+
+import inference
+
+def fake_gdown(monkeypatch, payload):
+    downloads = []
+
+    def download(url, output, quiet=False):
+        downloads.append(url)
+        with open(output, "wb") as f:
+            f.write(payload)
+
+    monkeypatch.setitem(sys.modules, "gdown", types.SimpleNamespace(download=download))
+    return downloads
+
+def test_own_model_is_never_verified_or_replaced(tmp_path, monkeypatch):
+    downloads = fake_gdown(monkeypatch, b"published")
+    own = tmp_path / "retrained.keras"
+    own.write_bytes(b"retrained")
+    pinned = hashlib.sha256(b"published").hexdigest()
+    assert inference.download_model(str(own), pinned) == str(own)
+    assert own.read_bytes() == b"retrained" and not downloads
+
+def test_missing_own_model_is_an_error(tmp_path, monkeypatch):
+    downloads = fake_gdown(monkeypatch, b"published")
+    with pytest.raises(FileNotFoundError):
+        inference.download_model(str(tmp_path / "missing.keras"))
+    assert not downloads and not (tmp_path / "missing.keras").exists()
+
+def test_published_model_is_replaced_when_the_checksum_differs(tmp_path, monkeypatch):
+    downloads = fake_gdown(monkeypatch, b"published")
+    published = tmp_path / "final_model.keras"
+    published.write_bytes(b"corrupt")
+    monkeypatch.setattr(inference, "MODEL_PATH", str(published))
+    inference.download_model(str(published), hashlib.sha256(b"published").hexdigest())
+    assert published.read_bytes() == b"published" and len(downloads) == 1
+    with pytest.raises(ValueError):
+        inference.download_model(str(published), "0" * 64, force=True)
+    assert published.read_bytes() == b"published"
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+import metrics
+
+def sample_map(metric):
+    return dict(metric.samples())
+
+def test_histogram_bounds_are_inclusive_and_cumulative():
+    histogram = metrics.Histogram("h", "Test.", (0.1, 0.5, 1.0))
+    for value in (0.05, 0.1, 0.3, 0.5, 2.0):
+        histogram.observe(value)
+    samples = sample_map(histogram)
+    # A value equal to a bound counts as <= that bound.
+    assert samples['h_bucket{le="0.1"}'] == 2
+    assert samples['h_bucket{le="0.5"}'] == 4
+    assert samples['h_bucket{le="1.0"}'] == 4
+    assert samples['h_bucket{le="+Inf"}'] == 5
+    assert samples["h_count"] == 5
+    assert samples["h_sum"] == pytest.approx(2.95)
+
+def test_histogram_lines_are_ordered_per_series():
+    histogram = metrics.Histogram("h", "Test.", (1.0,), ("stage",))
+    histogram.observe(0.5, stage="model")
+    histogram.observe(3.0, stage="decode")
+    names = [name for name, _ in histogram.samples()]
+    assert names == [
+        'h_bucket{stage="decode",le="1.0"}', 'h_bucket{stage="decode",le="+Inf"}',
+        'h_sum{stage="decode"}', 'h_count{stage="decode"}',
+        'h_bucket{stage="model",le="1.0"}', 'h_bucket{stage="model",le="+Inf"}',
+        'h_sum{stage="model"}', 'h_count{stage="model"}',
+    ]
+
+def test_label_values_are_escaped():
+    assert metrics._format_labels((), ()) == ""
+    formatted = metrics._format_labels(("label",), ('say "hi"\\\n',))
+    assert formatted == '{label="say \\"hi\\"\\\\\\n"}'
+
+def test_registry_renders_help_type_and_samples():
+    registry = metrics.Registry()
+    counter = registry.register(metrics.Counter("c_total", "A counter.", ("label",)))
+    counter.inc(label="Tomato___healthy")
+    counter.inc(2, label="Tomato___healthy")
+    assert registry.render() == (
+        "# HELP c_total A counter.\n"
+        "# TYPE c_total counter\n"
+        'c_total{label="Tomato___healthy"} 3\n'
+    )
+
+def test_stage_summary_reports_milliseconds(monkeypatch):
+    histogram = metrics.Histogram("stage", "Test.", metrics.LATENCY_BUCKETS, ("stage",))
+    monkeypatch.setattr(metrics, "STAGE_SECONDS", histogram)
+    histogram.observe(0.010, stage="model")
+    histogram.observe(0.030, stage="model")
+    with metrics.timed("decode"):
+        pass
+    summary = metrics.stage_summary()
+    assert list(summary) == ["decode", "model"]
+    assert summary["model"]["count"] == 2
+    assert summary["model"]["mean_ms"] == pytest.approx(20.0)
+    assert summary["model"]["last_ms"] == pytest.approx(30.0)
+
+def test_write_textfile_replaces_the_file_atomically(tmp_path):
+    path = tmp_path / "plant.prom"
+    path.write_text("stale\n")
+    metrics.write_textfile(str(path))
+    assert path.read_text() == metrics.render()
+    assert os.listdir(tmp_path) == ["plant.prom"]
@@ -0,0 +1,62 @@
+import multiprocessing
+import os
+import stat
+import time
+
+import numpy as np
+import pytest
+
+import backends
+import model_server
+
+@pytest.mark.parametrize("address, expected", [
+    ("/tmp/plant.sock", ("/tmp/plant.sock", "AF_UNIX")),
+    ("127.0.0.1:7000", (("127.0.0.1", 7000), "AF_INET")),
+    ("localhost:7000", (("localhost", 7000), "AF_INET")),
+    ("[::1]:7000", (("::1", 7000), "AF_INET")),
+])
+def test_parse_address(address, expected):
+    assert model_server.parse_address(address) == expected
+
+@pytest.mark.parametrize("address", ["0.0.0.0:7000", "10.1.2.3:7000", "example.com:7000"])
+def test_parse_address_refuses_non_loopback_hosts(address):
+    with pytest.raises(ValueError):
+        model_server.parse_address(address)
+
+def test_tcp_requires_an_explicit_authkey(monkeypatch):
+    monkeypatch.delenv("PLANT_MODEL_SERVER_AUTHKEY", raising=False)
+    with pytest.raises(ValueError):
+        model_server.authkey("AF_INET")
+    assert model_server.authkey("AF_UNIX") == model_server.DEFAULT_AUTHKEY.encode()
+    monkeypatch.setenv("PLANT_MODEL_SERVER_AUTHKEY", "s3cret")
+    assert model_server.authkey("AF_INET") == b"s3cret"
+
+class DoublingBackend(backends.InferenceBackend):
+    def predict(self, batch):
+        return np.repeat(batch.reshape(len(batch), -1)[:, :1] * 2, 3, axis=1)
+
+def serve(address):
+    model_server.ModelServer(DoublingBackend(), 3, address).serve_forever()
+
+def test_client_round_trip_over_unix_socket(tmp_path, monkeypatch):
+    monkeypatch.delenv("PLANT_MODEL_SERVER_AUTHKEY", raising=False)
+    address = str(tmp_path / "model.sock")
+    # A separate process, as in production: the server and client each own their side of the segment.
+    server = multiprocessing.get_context("spawn").Process(target=serve, args=(address,), daemon=True)
+    server.start()
+    try:
+        deadline = time.monotonic() + 30
+        while not os.path.exists(address) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert stat.S_IMODE(os.stat(address).st_mode) & 0o077 == 0
+
+        client = model_server.ModelServerClient(address, max_batch=2)
+        try:
+            batch = np.zeros((5,) + backends.INPUT_SHAPE, dtype=np.float32)
+            batch[:, 0, 0, 0] = np.arange(5)
+            np.testing.assert_allclose(client.predict(batch)[:, 0], np.arange(5) * 2)
+        finally:
+            client.close()
+    finally:
+        server.terminate()
+        server.join()
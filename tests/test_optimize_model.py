@@ -0,0 +1,16 @@
+import numpy as np
+
+import optimize_model
+
+def test_calibration_is_held_out_of_evaluation():
+    images = np.arange(40, dtype=np.float32).reshape(40, 1)
+    targets = np.arange(40) % 4
+    calibration, evaluation, eval_targets = optimize_model.split_calibration(images, targets, 10)
+    assert len(calibration) == 10 and len(evaluation) == 30
+    assert not set(calibration[:, 0]) & set(evaluation[:, 0])
+    assert np.array_equal(eval_targets, evaluation[:, 0].astype(int) % 4)
+
+def test_calibration_never_takes_more_than_half():
+    images = np.zeros((6, 1), dtype=np.float32)
+    calibration, evaluation, _ = optimize_model.split_calibration(images, np.zeros(6), 200)
+    assert len(calibration) == 3 and len(evaluation) == 3
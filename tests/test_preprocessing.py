@@ -0,0 +1,65 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import preprocessing
+
+TOLERANCE = 0.02
+
+def leaf_like_image(width, height, seed=0):
+    """
+    Smooth colour gradients with blotches and mild noise, roughly the
+    frequency content of a leaf photo.
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    img = np.empty((height, width, 3), dtype=np.float32)
+    img[..., 0] = 60 + 40 * np.sin(x / width * 6)
+    img[..., 1] = 140 + 60 * np.cos(y / height * 4)
+    img[..., 2] = 50 + 30 * np.sin((x + y) / (width + height) * 8)
+    for _ in range(12):
+        cx, cy, r = rng.uniform(0, width), rng.uniform(0, height), rng.uniform(0.02, 0.08) * width
+        spot = (x - cx) ** 2 + (y - cy) ** 2 < r ** 2
+        img[spot] = [120, 90, 40]
+    img += rng.normal(0, 4, img.shape)
+    return Image.fromarray(np.clip(img, 0, 255).astype(np.uint8))
+
+def encode(img, fmt):
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, **({"quality": 90} if fmt == "JPEG" else {}))
+    buf.seek(0)
+    return buf
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG"])
+@pytest.mark.parametrize("size", [(2048, 1536), (640, 480), (128, 128)])
+def test_fast_path_matches_reference_pipeline(fmt, size):
+    data = encode(leaf_like_image(*size), fmt).getvalue()
+    fast = preprocessing.Preprocessor().batch([preprocessing.open_image(io.BytesIO(data))])[0]
+    reference = preprocessing.reference_preprocess(io.BytesIO(data))
+    assert fast.shape == reference.shape == (128, 128, 3)
+    assert np.abs(fast - reference).mean() <= TOLERANCE
+
+def test_jpeg_is_decoded_at_reduced_resolution():
+    img = preprocessing.open_image(encode(leaf_like_image(2048, 1536), "JPEG"))
+    assert img.mode == "RGB"
+    assert img.size[0] < 2048 and img.size[0] >= 2 * preprocessing.TARGET_SIZE[0]
+
+def test_open_image_honours_min_size():
+    img = preprocessing.open_image(encode(leaf_like_image(2048, 1536), "JPEG"), min_size=(1024, 768))
+    assert img.size[0] >= 1024 and img.size[1] >= 768
+
+def test_to_array_scales_to_unit_range():
+    img = Image.fromarray(np.array([[[0, 128, 255]]], dtype=np.uint8))
+    out = preprocessing.to_array(img)
+    assert out.dtype == np.float32
+    np.testing.assert_allclose(out[0, 0], [0.0, 128 / 255, 1.0], rtol=1e-6)
+
+def test_preprocessor_reuses_its_buffer():
+    preprocessor = preprocessing.Preprocessor()
+    images = [leaf_like_image(200, 150, seed=i) for i in range(3)]
+    first = preprocessor.batch(images)
+    assert first.shape == (3, 128, 128, 3)
+    second = preprocessor.batch(images[:1])
+    assert np.shares_memory(first, second)
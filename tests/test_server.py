@@ -0,0 +1,91 @@
+import asyncio
+import base64
+import json
+import time
+
+import numpy as np
+import pytest
+
+import server
+
+@pytest.mark.parametrize("query, expected", [({}, 3), ({"top_k": ["1"]}, 1), ({"top_k": ["15"]}, 15)])
+def test_parse_top_k(query, expected):
+    assert server.parse_top_k(query, 3, 15) == expected
+
+@pytest.mark.parametrize("value", ["abc", "2.5", "", "0", "-1", "16"])
+def test_parse_top_k_rejects_bad_values_with_400(value):
+    with pytest.raises(server.HTTPError) as excinfo:
+        server.parse_top_k({"top_k": [value]}, 3, 15)
+    assert excinfo.value.status == 400
+
+def test_extract_image_bytes_from_json_and_raw_bodies():
+    body = json.dumps({"image": base64.b64encode(b"jpeg bytes").decode()}).encode()
+    assert server.extract_image_bytes({"content-type": "application/json"}, body) == b"jpeg bytes"
+    assert server.extract_image_bytes({"content-type": "image/jpeg"}, b"raw") == b"raw"
+    with pytest.raises(server.HTTPError):
+        server.extract_image_bytes({"content-type": "application/json"}, b'{"image": "not base64!"}')
+    with pytest.raises(server.HTTPError):
+        server.extract_image_bytes({}, b"")
+
+def test_batcher_coalesces_concurrent_requests():
+    batch_sizes = []
+
+    def predict(batch):
+        batch_sizes.append(len(batch))
+        return batch.reshape(len(batch), -1)[:, :2]
+
+    async def scenario():
+        batcher = server.DynamicBatcher(predict, max_batch_size=8, max_wait_ms=50)
+        batcher.start()
+        arrays = [np.full((2, 1, 1), i, dtype=np.float32) for i in range(5)]
+        results = await asyncio.gather(*(batcher.submit(a) for a in arrays))
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(scenario())
+    assert batch_sizes == [5]
+    assert [float(r[0]) for r in results] == [0, 1, 2, 3, 4]
+
+class ReadyLoader:
+    ready = True
+    state = "ready"
+    error = None
+
+    class backend:
+        @staticmethod
+        def predict(batch):
+            return np.tile(np.linspace(0, 1, 15, dtype=np.float32), (len(batch), 1))
+
+def test_requests_being_decoded_count_against_the_queue_limit(monkeypatch):
+    def slow_decode(data):
+        time.sleep(0.2)
+        return np.zeros((128, 128, 3), dtype=np.float32)
+
+    monkeypatch.setattr(server, "decode_image", slow_decode)
+    labels = {i: f"Class___{i}" for i in range(15)}
+
+    async def post(port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        body = b"jpeg bytes"
+        writer.write(
+            b"POST /predict HTTP/1.1\r\nContent-Type: image/jpeg\r\n"
+            + f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        writer.close()
+        return status
+
+    async def scenario():
+        app = server.InferenceServer(ReadyLoader(), labels, max_queue=2, decode_workers=2, max_wait_ms=1)
+        app.batcher.start()
+        http_server = await asyncio.start_server(app.handle, "127.0.0.1", 0)
+        port = http_server.sockets[0].getsockname()[1]
+        statuses = await asyncio.gather(*(post(port) for _ in range(10)))
+        http_server.close()
+        await app.batcher.stop()
+        return statuses, app.in_flight
+
+    statuses, in_flight = asyncio.run(scenario())
+    assert statuses.count(200) == 2 and statuses.count(503) == 8
+    assert in_flight == 0
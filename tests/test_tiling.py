@@ -0,0 +1,90 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import tiling
+
+LABELS = {0: "Tomato___Early_blight", 1: "Tomato___healthy", 2: "Potato___Late_blight"}
+
+class GreenIsHealthyBackend:
+    """
+    Calls a tile healthy if it is mostly green, early blight otherwise.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, batch):
+        self.calls += 1
+        green = batch[..., 1].mean(axis=(1, 2)) > 0.5
+        probabilities = np.zeros((len(batch), 3), dtype=np.float32)
+        probabilities[green, 1] = 0.9
+        probabilities[green, 0] = 0.1
+        probabilities[~green, 0] = 0.9
+        probabilities[~green, 1] = 0.1
+        return probabilities
+
+def field(width=1024, height=512):
+    """
+    Left half green foliage, right half brown soil.
+    """
+    pixels = np.zeros((height, width, 3), dtype=np.uint8)
+    pixels[:, : width // 2] = (40, 160, 40)
+    pixels[:, width // 2:] = (120, 90, 60)
+    return Image.fromarray(pixels)
+
+@pytest.mark.parametrize("length, tile, stride, expected", [
+    (100, 200, 50, [0]),
+    (256, 256, 192, [0]),
+    (600, 256, 192, [0, 192, 344]),
+    (640, 256, 192, [0, 192, 384]),
+])
+def test_tile_starts_cover_the_edge(length, tile, stride, expected):
+    assert tiling.tile_starts(length, tile, stride) == expected
+
+def test_vegetation_fractions_use_excess_green():
+    strip = np.asarray(field(512, 64))
+    fractions = tiling.vegetation_fractions(strip, 64, [0, 192, 256, 448])
+    np.testing.assert_allclose(fractions, [1.0, 1.0, 0.0, 0.0])
+
+def test_background_tiles_are_skipped():
+    tiles = list(tiling.iter_tiles(field(), 256, 0.0, tiling.MIN_VEGETATION_FRACTION))
+    assert tiles and all(box[2] <= 512 for _, _, box, _ in tiles)
+
+def test_predict_tiled_builds_maps_and_aggregates():
+    backend = GreenIsHealthyBackend()
+    result = tiling.predict_tiled(backend, LABELS, field(), tile_size=256, overlap=0.0, batch_size=2)
+    rows, cols = tiling.grid_shape((1024, 512), 256, 0.0)
+    assert result["label_map"].shape == result["disease_map"].shape == (rows, cols)
+    assert result["label"] == "Tomato___healthy"
+    assert result["tile_counts"] == {"Tomato___healthy": 4}
+    # Soil columns are background: no label, no disease value.
+    assert (result["label_map"][:, 2:] == -1).all() and np.isnan(result["disease_map"][:, 2:]).all()
+    assert backend.calls == 2
+
+def test_predict_tiled_without_vegetation():
+    soil = Image.new("RGB", (512, 512), (120, 90, 60))
+    result = tiling.predict_tiled(GreenIsHealthyBackend(), LABELS, soil)
+    assert result["label"] is None and result["boxes"] == []
+
+def test_open_bounded_limits_decoded_size():
+    buf = io.BytesIO()
+    field(4000, 3000).save(buf, format="JPEG")
+    buf.seek(0)
+    img = tiling.open_bounded(buf, max_pixels=1_000_000, max_side=1500)
+    assert max(img.size) <= 1500
+
+def test_open_bounded_rejects_huge_non_jpeg(monkeypatch):
+    monkeypatch.setattr(tiling, "HARD_MAX_PIXELS", 100 * 100)
+    buf = io.BytesIO()
+    field(200, 200).save(buf, format="PNG")
+    buf.seek(0)
+    with pytest.raises(ValueError):
+        tiling.open_bounded(buf)
+
+def test_render_heatmap_keeps_thumbnail_size():
+    img = field()
+    result = tiling.predict_tiled(GreenIsHealthyBackend(), LABELS, img, tile_size=256, overlap=0.0)
+    assert tiling.render_heatmap(img, result, max_side=400).size == (400, 200)
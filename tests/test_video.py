@@ -0,0 +1,89 @@
+import sys
+import types
+
+import numpy as np
+import pytest
+
+import video
+
+LABELS = {0: "Tomato___Early_blight", 1: "Tomato___healthy"}
+
+class BrightnessBackend:
+    """
+    Bright frames are healthy, dark ones early blight.
+    """
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def predict(self, batch):
+        self.batch_sizes.append(len(batch))
+        bright = batch.mean(axis=(1, 2, 3)) > 0.5
+        return np.stack([np.where(bright, 0.2, 0.8), np.where(bright, 0.8, 0.2)], axis=1)
+
+def frame(value, size=(96, 160)):
+    return np.full(size + (3,), value, dtype=np.uint8)
+
+def test_change_detector_skips_near_identical_frames():
+    detector = video.ChangeDetector(threshold=0.05)
+    assert detector.is_new(frame(100))
+    assert not detector.is_new(frame(103))
+    assert detector.is_new(frame(200))
+    # The reference is the last scored frame, so slow drift is eventually caught.
+    assert not detector.is_new(frame(210))
+    assert detector.is_new(frame(220))
+
+def test_scan_frames_scores_only_changes_and_credits_skipped_time():
+    frames = [(i * 0.5, frame(v)) for i, v in enumerate([220, 220, 220, 30, 30, 220])]
+    backend = BrightnessBackend()
+    result = video.scan_frames(backend, LABELS, frames, sample_interval=0.5, batch_size=2)
+    assert result["frames_sampled"] == 6
+    assert result["frames_scored"] == 3
+    assert backend.batch_sizes == [2, 1]
+    assert result["class_seconds"] == pytest.approx({"Tomato___healthy": 2.0, "Tomato___Early_blight": 1.0})
+    assert result["class_frames"] == {"Tomato___healthy": 2, "Tomato___Early_blight": 1}
+    assert result["label"] == "Tomato___healthy"
+    assert [t for t, _, _ in result["timeline"]] == [0.0, 1.5, 2.5]
+
+def test_scan_frames_with_no_frames():
+    result = video.scan_frames(BrightnessBackend(), LABELS, [], sample_interval=0.5)
+    assert result["label"] is None and result["frames_scored"] == 0
+
+@pytest.mark.parametrize("fps, sample_fps, step, interval", [
+    (24.0, 10.0, 2, 2 / 24),
+    (30.0, 2.0, 15, 0.5),
+    (10.0, 20.0, 1, 0.1),
+])
+def test_sampling_step_reports_the_real_interval(fps, sample_fps, step, interval):
+    assert video.sampling_step(fps, sample_fps) == (step, pytest.approx(interval))
+
+def test_scan_video_credits_the_real_frame_interval(monkeypatch):
+    class FakeCapture:
+        def __init__(self, path):
+            self.frames = [frame(220)] * 24
+            self.index = -1
+
+        def isOpened(self):
+            return True
+
+        def get(self, prop):
+            return 24.0
+
+        def grab(self):
+            self.index += 1
+            return self.index < len(self.frames)
+
+        def retrieve(self):
+            return True, self.frames[self.index]
+
+        def release(self):
+            pass
+
+    fake_cv2 = types.SimpleNamespace(
+        VideoCapture=FakeCapture, CAP_PROP_FPS=5, COLOR_BGR2RGB=4, cvtColor=lambda f, code: f
+    )
+    monkeypatch.setitem(sys.modules, "cv2", fake_cv2)
+    result = video.scan_video(BrightnessBackend(), LABELS, "clip.mp4", sample_fps=10.0)
+    # One second of 24 fps footage sampled every 2nd frame: 12 samples of 1/12 s.
+    assert result["frames_sampled"] == 12
+    assert result["class_seconds"] == pytest.approx({"Tomato___healthy": 1.0})
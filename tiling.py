@@ -0,0 +1,189 @@
+"""
+Tiled inference for wide field photos showing many leaves.
+
+Instead of squashing the whole photo to 128x128, the image is cut into
+overlapping square tiles that are each roughly one leaf across, and every
+tile is classified on its own. Memory stays bounded regardless of input size:
+
+- the photo is decoded at a reduced resolution (JPEG draft mode) so the
+  decoded image never exceeds `max_pixels`; other formats above a hard limit
+  are rejected rather than risk exhausting a worker;
+- tiles are cut from one horizontal strip at a time, and only one model
+  batch of float32 tiles exists at once.
+
+Background tiles (soil, sky, stakes) are skipped with a vectorized Excess
+Green (ExG = 2G - R - B) heuristic evaluated per strip through an integral
+image, so each tile's vegetation fraction costs O(1).
+
+The result holds a per-tile heatmap of disease probability and an aggregated
+diagnosis over all vegetation tiles.
+"""
+import numpy as np
+from PIL import Image
+
+import backends
+import metrics
+import preprocessing
+
+DEFAULT_MAX_PIXELS = 12_000_000
+# Non-JPEG inputs can't be decoded at reduced size; refuse anything larger.
+HARD_MAX_PIXELS = 4 * DEFAULT_MAX_PIXELS
+DEFAULT_MAX_SIDE = 2048
+DEFAULT_TILE_SIZE = 256
+DEFAULT_OVERLAP = 0.25
+EXG_THRESHOLD = 20
+MIN_VEGETATION_FRACTION = 0.2
+
+# --- 1. BOUNDED DECODING ---
+def open_bounded(source, max_pixels=DEFAULT_MAX_PIXELS, max_side=DEFAULT_MAX_SIDE):
+    """
+    Opens a photo at a resolution whose longest side is at most `max_side`,
+    never decoding more than `max_pixels` pixels for JPEGs.
+    """
+    img = Image.open(source)
+    width, height = img.size
+    if img.format == "JPEG" and width * height > max_pixels:
+        # draft() picks the smallest DCT scale whose size is still >= the request,
+        # i.e. less than twice the request per side, so ask for half the budget.
+        scale = (max_pixels / (width * height)) ** 0.5 / 2
+        img.draft("RGB", (max(int(width * scale), 1), max(int(height * scale), 1)))
+    elif width * height > HARD_MAX_PIXELS:
+        raise ValueError(
+            f"{img.format} image of {width}x{height} pixels is too large for tiled inference; "
+            f"limit is {HARD_MAX_PIXELS} pixels for non-JPEG images."
+        )
+    img = img.convert("RGB")
+    if max(img.size) > max_side:
+        img.thumbnail((max_side, max_side), Image.BILINEAR)
+    return img
+
+# --- 2. TILING ---
+def tile_starts(length, tile_size, stride):
+    """
+    Start offsets covering [0, length) with the last tile flush to the edge.
+    """
+    if length <= tile_size:
+        return [0]
+    starts = list(range(0, length - tile_size + 1, stride))
+    if starts[-1] != length - tile_size:
+        starts.append(length - tile_size)
+    return starts
+
+def vegetation_fractions(strip, tile_size, x_starts):
+    """
+    Fraction of Excess-Green pixels in each tile of a (tile_size, W, 3) uint8 strip.
+    """
+    rgb = strip.astype(np.int16)
+    exg = 2 * rgb[..., 1] - rgb[..., 0] - rgb[..., 2]
+    column_counts = np.count_nonzero(exg > EXG_THRESHOLD, axis=0)
+    integral = np.concatenate([[0], np.cumsum(column_counts)])
+    xs = np.asarray(x_starts)
+    return (integral[xs + tile_size] - integral[xs]) / float(tile_size * strip.shape[0])
+
+def iter_tiles(img, tile_size, overlap, min_vegetation):
+    """
+    Yields (row, col, box, tile image) for every vegetation tile, one strip at a time.
+    """
+    width, height = img.size
+    tile_size = min(tile_size, width, height)
+    stride = max(int(tile_size * (1 - overlap)), 1)
+    x_starts = tile_starts(width, tile_size, stride)
+    for row, y0 in enumerate(tile_starts(height, tile_size, stride)):
+        strip = np.asarray(img.crop((0, y0, width, y0 + tile_size)))
+        fractions = vegetation_fractions(strip, tile_size, x_starts)
+        for col, (x0, fraction) in enumerate(zip(x_starts, fractions)):
+            if fraction >= min_vegetation:
+                tile = Image.fromarray(strip[:, x0:x0 + tile_size])
+                yield row, col, (x0, y0, x0 + tile_size, y0 + tile_size), tile
+
+def grid_shape(size, tile_size, overlap):
+    width, height = size
+    tile_size = min(tile_size, width, height)
+    stride = max(int(tile_size * (1 - overlap)), 1)
+    return len(tile_starts(height, tile_size, stride)), len(tile_starts(width, tile_size, stride))
+
+# --- 3. INFERENCE ---
+def predict_tiled(backend, labels, img, tile_size=DEFAULT_TILE_SIZE, overlap=DEFAULT_OVERLAP,
+                  batch_size=32, min_vegetation=MIN_VEGETATION_FRACTION):
+    """
+    Classifies every vegetation tile of `img` and aggregates the results.
+
+    Returns a dict with:
+        label, confidence   the diagnosis from the mean probabilities over all tiles
+        class_scores        {label: mean probability}
+        tile_counts         {label: number of tiles where it was the top class}
+        disease_map         (rows, cols) probability of any disease, NaN for background
+        label_map           (rows, cols) top class index, -1 for background
+        boxes               tile boxes in `img` coordinates, aligned with `probabilities`
+        probabilities       (n_tiles, num_classes) array
+    """
+    rows, cols = grid_shape(img.size, tile_size, overlap)
+    num_classes = len(labels)
+    healthy = np.array([labels[i].endswith("healthy") for i in range(num_classes)])
+
+    buffer = np.empty((batch_size,) + backends.INPUT_SHAPE, dtype=np.float32)
+    positions, boxes, probabilities = [], [], []
+    pending = 0
+
+    def flush(n):
+        with metrics.timed("model"):
+            probabilities.append(np.array(backend.predict(buffer[:n])))
+
+    with metrics.timed("tiling"):
+        for row, col, box, tile in iter_tiles(img, tile_size, overlap, min_vegetation):
+            preprocessing.to_array(preprocessing.resize(tile), out=buffer[pending])
+            positions.append((row, col))
+            boxes.append(box)
+            pending += 1
+            if pending == batch_size:
+                flush(pending)
+                pending = 0
+        if pending:
+            flush(pending)
+
+    label_map = np.full((rows, cols), -1, dtype=np.int32)
+    disease_map = np.full((rows, cols), np.nan, dtype=np.float32)
+    if not positions:
+        return {
+            "label": None, "confidence": 0.0, "class_scores": {}, "tile_counts": {},
+            "disease_map": disease_map, "label_map": label_map, "boxes": [],
+            "probabilities": np.empty((0, num_classes), dtype=np.float32),
+        }
+
+    probabilities = np.concatenate(probabilities)
+    top = np.argmax(probabilities, axis=1)
+    r, c = np.array(positions).T
+    label_map[r, c] = top
+    disease_map[r, c] = probabilities[:, ~healthy].sum(axis=1)
+
+    mean = probabilities.mean(axis=0)
+    best = int(np.argmax(mean))
+    counts = np.bincount(top, minlength=num_classes)
+    return {
+        "label": labels[best],
+        "confidence": float(mean[best]),
+        "class_scores": {labels[i]: float(p) for i, p in enumerate(mean)},
+        "tile_counts": {labels[i]: int(n) for i, n in enumerate(counts) if n},
+        "disease_map": disease_map,
+        "label_map": label_map,
+        "boxes": boxes,
+        "probabilities": probabilities,
+    }
+
+def render_heatmap(img, result, max_side=800, alpha=0.45):
+    """
+    Overlays the disease probability map on a thumbnail of `img`:
+    green = healthy, red = diseased, untouched = background.
+    """
+    thumb = img.copy()
+    thumb.thumbnail((max_side, max_side))
+    disease = result["disease_map"]
+    if not np.isfinite(disease).any():
+        return thumb
+    colors = np.zeros(disease.shape + (4,), dtype=np.uint8)
+    valid = np.isfinite(disease)
+    colors[..., 0] = np.where(valid, np.nan_to_num(disease) * 255, 0)
+    colors[..., 1] = np.where(valid, (1 - np.nan_to_num(disease)) * 255, 0)
+    colors[..., 3] = np.where(valid, int(alpha * 255), 0)
+    overlay = Image.fromarray(colors, "RGBA").resize(thumb.size, Image.BILINEAR)
+    return Image.alpha_composite(thumb.convert("RGBA"), overlay).convert("RGB")
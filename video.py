@@ -0,0 +1,183 @@
+"""
+Camera and video scouting: score a walk along a crop row instead of dozens of stills.
+
+Frames are sampled at a configurable rate and run through a cheap change
+check first: each frame is shrunk to a tiny grayscale thumbnail and compared
+with the thumbnail of the last frame that was actually scored. Only frames
+that differ by more than a threshold are batched through the model, so the
+compute per clip grows with the number of scene changes, not the number of
+frames. A skipped frame inherits the diagnosis of the last scored frame, which
+is how detections are aggregated over the clip's duration.
+
+Reading video files needs OpenCV (`opencv-python-headless`).
+"""
+import numpy as np
+from PIL import Image
+
+import metrics
+import preprocessing
+
+DEFAULT_SAMPLE_FPS = 2.0
+DEFAULT_CHANGE_THRESHOLD = 0.06
+THUMBNAIL_SIZE = (32, 32)
+
+# --- 1. CHANGE DETECTION ---
+class ChangeDetector:
+    """
+    Flags frames that differ noticeably from the last frame that was scored.
+    The difference is the mean absolute difference of 32x32 grayscale
+    thumbnails, in [0, 1].
+    """
+
+    def __init__(self, threshold=DEFAULT_CHANGE_THRESHOLD):
+        self.threshold = threshold
+        self._last = None
+
+    @staticmethod
+    def thumbnail(frame):
+        img = frame if isinstance(frame, Image.Image) else Image.fromarray(frame)
+        img = img.convert("L")
+        return np.asarray(img.resize(THUMBNAIL_SIZE, Image.BILINEAR), dtype=np.float32) / 255.0
+
+    def is_new(self, frame):
+        """
+        Returns True (and makes this the reference frame) if `frame` should be scored.
+        """
+        thumb = self.thumbnail(frame)
+        if self._last is not None and float(np.abs(thumb - self._last).mean()) <= self.threshold:
+            return False
+        self._last = thumb
+        return True
+
+# --- 2. FRAME SAMPLING ---
+def sampling_step(fps, sample_fps):
+    """
+    Returns (step, interval): every `step`-th frame of a `fps` video is
+    sampled, which is as close to `sample_fps` as whole frames allow, and
+    each sample stands for `interval` = step / fps seconds of footage.
+    """
+    step = max(int(round(fps / sample_fps)), 1)
+    return step, step / fps
+
+def open_video_frames(path, sample_fps=DEFAULT_SAMPLE_FPS):
+    """
+    Opens a video and returns (interval, frames), where `frames` yields
+    (timestamp in seconds, RGB uint8 frame) at roughly `sample_fps` and
+    `interval` is the footage each sampled frame actually stands for (see
+    `sampling_step`). Frames between samples are grabbed but never decoded.
+    """
+    try:
+        import cv2
+    except ImportError:
+        raise ImportError("Video scouting needs OpenCV: pip install opencv-python-headless")
+
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video {path}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    step, interval = sampling_step(fps, sample_fps)
+
+    def frames():
+        try:
+            index = 0
+            while capture.grab():
+                if index % step == 0:
+                    ok, frame = capture.retrieve()
+                    if not ok:
+                        break
+                    yield index / fps, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                index += 1
+        finally:
+            capture.release()
+
+    return interval, frames()
+
+# --- 3. CLIP SCORING ---
+def scan_frames(backend, labels, frames, sample_interval, detector=None, batch_size=16):
+    """
+    Scores the frames that pass the change check and aggregates detections.
+
+    `frames` yields (timestamp, RGB frame); `sample_interval` is the time each
+    sampled frame stands for. Returns a dict with:
+        label, confidence   the class detected for the longest time
+        class_seconds       {label: seconds of footage attributed to it}
+        class_frames        {label: number of scored frames where it was top-1}
+        timeline            [(timestamp, label, confidence)] for each scored frame
+        frames_sampled, frames_scored
+    """
+    detector = detector or ChangeDetector()
+    preprocessor = preprocessing.Preprocessor()
+    timeline = []
+    class_seconds = {}
+    class_frames = {}
+    pending_frames, pending_times = [], []
+    # Seconds of footage since each pending frame, credited once it is classified.
+    pending_durations = []
+    sampled = 0
+    last_label = None
+
+    def flush():
+        nonlocal last_label
+        if not pending_frames:
+            return
+        with metrics.timed("preprocess"):
+            batch = preprocessor.batch(pending_frames)
+        with metrics.timed("model"):
+            probabilities = np.asarray(backend.predict(batch))
+        for t, duration, p in zip(pending_times, pending_durations, probabilities):
+            index = int(np.argmax(p))
+            label, confidence = labels[index], float(p[index])
+            metrics.record_prediction(label, confidence)
+            timeline.append((t, label, confidence))
+            class_frames[label] = class_frames.get(label, 0) + 1
+            class_seconds[label] = class_seconds.get(label, 0.0) + duration
+            last_label = label
+        pending_frames.clear()
+        pending_times.clear()
+        pending_durations.clear()
+
+    for t, frame in frames:
+        sampled += 1
+        with metrics.timed("change_detection"):
+            is_new = detector.is_new(frame)
+        if is_new:
+            pending_frames.append(preprocessing.resize(Image.fromarray(frame)))
+            pending_times.append(t)
+            pending_durations.append(sample_interval)
+            if len(pending_frames) == batch_size:
+                flush()
+        elif pending_durations:
+            pending_durations[-1] += sample_interval
+        elif last_label is not None:
+            class_seconds[last_label] += sample_interval
+    flush()
+
+    result = {
+        "label": None,
+        "confidence": 0.0,
+        "class_seconds": class_seconds,
+        "class_frames": class_frames,
+        "timeline": timeline,
+        "frames_sampled": sampled,
+        "frames_scored": len(timeline),
+    }
+    if timeline:
+        label = max(class_seconds, key=class_seconds.get)
+        result["label"] = label
+        result["confidence"] = float(np.mean([c for _, l, c in timeline if l == label]))
+    return result
+
+def scan_video(backend, labels, path, sample_fps=DEFAULT_SAMPLE_FPS, change_threshold=DEFAULT_CHANGE_THRESHOLD,
+               batch_size=16):
+    """
+    Samples a video file and scores it with `scan_frames`.
+    """
+    interval, frames = open_video_frames(path, sample_fps)
+    return scan_frames(
+        backend,
+        labels,
+        frames,
+        sample_interval=interval,
+        detector=ChangeDetector(change_threshold),
+        batch_size=batch_size
+    )